@@ -1,34 +1,51 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
-from openai import OpenAI
-from fastapi.responses import StreamingResponse
+from openai import AsyncOpenAI
+from fastapi.responses import Response, StreamingResponse
 
 import json
+import time
+import asyncio
+import contextlib
+from typing import Optional
 
 import os
 from dotenv import load_dotenv
 
+from ai_fresh import metrics
+from ai_fresh.sessions import SessionStore
+from ai_fresh.framing import MEDIA_TYPE, STREAM_BUFFER_SIZE, ClientDisconnected, StreamStats, framed
+
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+client = AsyncOpenAI(api_key=api_key)
+sessions = SessionStore()
+stream_stats = StreamStats()
 
 app = FastAPI()
+app.middleware("http")(metrics.server_timing_middleware)
+metrics.gauge("stream_total", "Streamed answers and tokens, tokens_saved is estimated.", "counter", stream_stats.stats)
 
 class QuestionRequest(BaseModel):
     question: str
-    chat_history: str
+    # with a session id the history is kept here and chat_history is not needed
+    chat_history: str = ""
+    session_id: Optional[str] = None
 class AnswerResponse(BaseModel):
     reply: str
 
 @app.post("/ask/", response_model=AnswerResponse)
-async def ask(request: QuestionRequest):
+async def ask(request: QuestionRequest, http_request: Request):
     if not request.question:
         raise HTTPException(status_code=400, detail="Question content is empty")
+
+    session = None if request.chat_history and not request.session_id else sessions.get(request.session_id)
+    chat_history = json.dumps(session.history()) if session else request.chat_history
     
     context = f"""
     I am helpful assistant. I am answering questions considering the history of the conversation and the rules which have been set:
 
-    Chat history: '''{request.chat_history}'''
+    Chat history: '''{chat_history}'''
     
     RULES: '''
     - My name is Turingo from AI Fresh and I am AI assistant.
@@ -37,19 +54,88 @@ async def ask(request: QuestionRequest):
     '''
     """
 
-    
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": context},
-            {"role": "user", "content": request.question}
-        ],
-        stream=True
-    )
-    
-    def generate():
-        for item in response:
-            if item.choices[0].delta.content:
-                yield json.dumps({"reply": item.choices[0].delta.content}) + "\n"
-    return StreamingResponse(generate(), media_type="application/json")
+
+    messages = [
+        {"role": "system", "content": context},
+        {"role": "user", "content": request.question}
+    ]
+    # bounded, so a slow client pauses reading the completion instead of growing the buffer
+    queue = asyncio.Queue(maxsize=STREAM_BUFFER_SIZE)
+
+    async def produce():
+        # reads the completion while framed() batches it into frames and sends heartbeats
+        started = time.perf_counter()
+        answer = []
+        finish_reason = None
+        usage = None
+        response = None
+        stream_stats.start()
+        try:
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            metrics.record("open_stream", time.perf_counter() - started, model="gpt-4o")
+            async for item in response:
+                if item.usage:
+                    usage = item.usage.model_dump()
+                if not item.choices:
+                    continue
+                finish_reason = item.choices[0].finish_reason or finish_reason
+                if item.choices[0].delta.content:
+                    if not answer:
+                        metrics.record("first_token", time.perf_counter() - started, model="gpt-4o")
+                    answer.append(item.choices[0].delta.content)
+                    await queue.put(item.choices[0].delta.content)
+        except asyncio.CancelledError:
+            # the client is gone, stop paying for tokens nobody reads
+            stream_stats.cancel(len(answer))
+            with contextlib.suppress(asyncio.QueueFull):
+                queue.put_nowait(ClientDisconnected())
+            raise
+        except Exception as e:
+            stream_stats.fail(len(answer))
+            await queue.put(e)
+            return
+        finally:
+            if response is not None:
+                await response.close()
+        stream_stats.complete(usage["completion_tokens"] if usage else len(answer))
+        metrics.record("completion", time.perf_counter() - started, model="gpt-4o")
+        if session:
+            session.append("Human", request.question)
+            session.append("AI", "".join(answer))
+        await queue.put({"usage": usage, "finish_reason": finish_reason})
+
+    async def watch_disconnect(producer):
+        while not producer.done():
+            message = await http_request.receive()
+            if message["type"] == "http.disconnect":
+                producer.cancel()
+                return
+
+    async def generate():
+        producer = asyncio.ensure_future(produce())
+        watcher = asyncio.ensure_future(watch_disconnect(producer))
+        try:
+            async for frame in framed(queue):
+                yield frame
+        finally:
+            producer.cancel()
+            watcher.cancel()
+    return StreamingResponse(generate(), media_type=MEDIA_TYPE)
+
+@app.get("/stream/stats/")
+async def get_stream_stats():
+    return stream_stats.stats()
+
+@app.get("/sessions/stats/")
+async def sessions_stats():
+    return sessions.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
     
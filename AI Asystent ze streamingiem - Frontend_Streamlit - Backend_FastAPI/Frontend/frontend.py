@@ -1,29 +1,48 @@
 import streamlit as st
 import requests
 import json
+import uuid
 
-def get_response(user_query, chat_history):
+def get_response(user_query, session_id):
     url = "http://localhost:8000/ask"
+    # the backend keeps the chat history of the session, only the new message is sent
     data = {
         "question": user_query,
-        "chat_history": json.dumps(chat_history)
+        "session_id": session_id
         }
     headers = {"Content-Type": "application/json"}
     response = requests.post(url, json=data, headers=headers, stream=True)
+    st.session_state.last_usage = None
     if response.status_code == 200:
-        for line in response.iter_lines():
-            if line: 
-                decoded_line = json.loads(line.decode("utf-8"))
-                yield decoded_line.get("reply", "")
+        for frame in iter_frames(response):
+            if frame.get("type") == "delta":
+                yield frame.get("reply", "")
+            elif frame.get("type") == "done":
+                st.session_state.last_usage = frame.get("usage")
+            elif frame.get("type") == "error":
+                yield "Error: " + str(frame.get("detail"))
+            # heartbeat frames only keep the connection alive
             
     else:
         return "Error: " + str(response.status_code)
 
+def iter_frames(response):
+    """Parse NDJSON frames as bytes arrive, without waiting for a full read buffer."""
+    buffer = b""
+    for data in response.iter_content(chunk_size=None):
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
 st.set_page_config(page_title="AI_Fresh Assistat")
 st.title("🍀 AI Assistant")
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 print(st.session_state.chat_history)
 
@@ -41,5 +60,8 @@ if user_query:
     with st.chat_message("Human"):
         st.markdown(user_query)
     with st.chat_message("AI"):
-        response = st.write_stream(get_response(user_query, st.session_state.chat_history))
+        response = st.write_stream(get_response(user_query, st.session_state.session_id))
+        usage = st.session_state.get("last_usage")
+        if usage:
+            st.caption(f"{usage.get('total_tokens')} tokens")
         st.session_state.chat_history.append(({"type": "AI", "content": response}))
@@ -0,0 +1,138 @@
+import os
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+from ai_fresh.metrics import record
+
+load_dotenv()
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+DEVICE_CONCURRENCY = int(os.getenv("NXAPI_DEVICE_CONCURRENCY", "2"))
+GLOBAL_CONCURRENCY = int(os.getenv("NXAPI_GLOBAL_CONCURRENCY", "32"))
+
+# user session the current request belongs to, set by the backend per request
+session_id = contextvars.ContextVar("session_id", default="anonymous")
+
+
+class FairLimiter:
+    """
+    Admission control for NX-API requests: at most per_device requests run
+    on one device and at most total overall. Requests over the limits wait
+    in one queue per session and the queues are served round robin, so a
+    fleet-wide query from one user only delays others by one slot at a time.
+    Within a session, a request waiting for a busy device does not block
+    the session's requests to other devices.
+    """
+
+    def __init__(self, total=GLOBAL_CONCURRENCY, per_device=DEVICE_CONCURRENCY):
+        self.total = total
+        self.per_device = per_device
+        self.active = 0
+        self.admitted = 0
+        self.queued_total = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._devices = {}
+        self._queues = OrderedDict()
+
+    def _free(self, device):
+        return self.active < self.total and self._devices.get(device, 0) < self.per_device
+
+    def _take(self, device):
+        self.active += 1
+        self._devices[device] = self._devices.get(device, 0) + 1
+
+    async def acquire(self, device, session=None):
+        device = device.lower()
+        session = session or session_id.get()
+        if not self._queues and self._free(device):
+            self._take(device)
+            self.admitted += 1
+            return 0.0
+
+        started = time.monotonic()
+        waiter = (device, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(session, deque()).append(waiter)
+        self.queued_total += 1
+        self._dispatch()
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter[1].done() and not waiter[1].cancelled():
+                self.release(device)
+            else:
+                self._remove(session, waiter)
+            raise
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.waits += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def release(self, device):
+        device = device.lower()
+        self.active -= 1
+        self._devices[device] -= 1
+        if not self._devices[device]:
+            del self._devices[device]
+        self._dispatch()
+
+    def _remove(self, session, waiter):
+        queue = self._queues.get(session)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[session]
+
+    def _dispatch(self):
+        """Grant free slots one session at a time, moving each served session to the back."""
+        granted = True
+        while granted and self.active < self.total:
+            granted = False
+            for session in list(self._queues):
+                queue = self._queues[session]
+                waiter = next((waiter for waiter in queue if self._free(waiter[0])), None)
+                if waiter is None:
+                    continue
+                queue.remove(waiter)
+                if queue:
+                    self._queues.move_to_end(session)
+                else:
+                    del self._queues[session]
+                self._take(waiter[0])
+                waiter[1].set_result(None)
+                granted = True
+                break
+
+    @asynccontextmanager
+    async def slot(self, device, session=None):
+        waited = await self.acquire(device, session)
+        if waited:
+            record("queue", waited, device=device)
+        try:
+            yield
+        finally:
+            self.release(device)
+
+    def depth(self):
+        """Waiting requests per session."""
+        return {session: len(queue) for session, queue in self._queues.items()}
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": sum(self.depth().values()),
+            "queued_by_session": self.depth(),
+            "active_by_device": dict(self._devices),
+            "admitted": self.admitted,
+            "waited": self.queued_total,
+            "avg_wait_seconds": self.wait_seconds / self.waits if self.waits else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
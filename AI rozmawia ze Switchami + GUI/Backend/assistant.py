@@ -1,267 +1,205 @@
 import os
 import json
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from openai import OpenAI
+from openai.types.chat import ChatCompletion
+from nxapi import get_client, parse_device_ips
+from inventory import get_inventory
+from nxos_tables import compact_result
+from history import HistoryManager
+from router import ROUTER_ENABLED, Router, classify
+from llm_cache import get_llm_cache
+from changes import get_change_tracker
+from prompts import PromptBuilder
+from precheck import CONFIG_PRECHECK, PRECHECK_COMMAND, applied_entry, group_plans
+from ai_fresh.metrics import timed
 
 load_dotenv()
 
+STRUCTURED_OUTPUT = os.getenv("NXAPI_STRUCTURED", "1") == "1"
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "4"))
+
+
+def changes_configuration(tool_calls):
+    return any(tool_call["function"]["name"] == "configure_devices" for tool_call in tool_calls)
+
+
+def cacheable_response(response):
+    """False for a completion calling a tool that changes the configuration, a replay would push it again."""
+    tool_calls = response.choices[0].message.tool_calls if response.choices else None
+    return not (tool_calls and changes_configuration([tool_call_dict(tool_call) for tool_call in tool_calls]))
+
+
+def tool_call_dict(tool_call):
+    return {
+        "id": tool_call.id,
+        "type": "function",
+        "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments},
+    }
+
+
 class NetworkAssistant:
-    def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key, nxapi_client=None, structured=STRUCTURED_OUTPUT, history=None,
+                 inventory=None, router=None, llm_cache=None, changes=None, prompts=None):
+        self.client = self.make_client(api_key)
+        self.nxapi = nxapi_client or self.make_nxapi()
+        self.structured = structured
+        self.history = history or HistoryManager()
+        self.inventory = inventory or get_inventory()
+        self.router = router or (Router(inventory=self.inventory) if ROUTER_ENABLED else None)
+        self.llm_cache = llm_cache or get_llm_cache()
+        self.changes = changes or get_change_tracker()
+        self.prompts = prompts or PromptBuilder()
+
+    def make_client(self, api_key):
+        return OpenAI(api_key=api_key)
+
+    def make_nxapi(self):
+        return get_client()
 
     def make_decision(self, user_input, chat_history):
-            
-        tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "get_info_from_devices",
-                "description": """
-                Get information from Cisco switches 
-                based on show commands
-                """,
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "device_ips": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": """
-                                List of device IP addresses or switch name. 
-                                If there is more than 1 IP Address or 
-                                switchname provided, then it should be 
-                                provided in the same string and separated 
-                                with ; character.
-                                """,
-                        },
-                        "show_cmd": {
-                            "type": "string",
-                            "description": """
-                                The show command to be executed on the 
-                                devices. This should be a valid Cisco NX-OS 
-                                show command.
-                                """,
-                        },
-                    },
-                    "required": ["device_ips", "show_cmd"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "configure_devices",
-                "description": """
-                configure devices
-                """,
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "device_ips": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": """
-                                List of device IP addresses or switch name. 
-                                If there is more than 1 IP Address or 
-                                switchname provided, then it should be 
-                                provided in the same string and separated 
-                                with ; character.
-                                """,
-                        },
-                        "configuration_cmd": {
-                            "type": "array",
-                            "items": {"type:": "string"},
-                            "description": """
-                                Configuration command to be executed on the 
-                                devices. This should be a valid Cisco NX-OS 
-                                show command.
-                                """,
-                        },
-                    },
-                    "required": ["device_ips", "configuration_cmd"],
-                },
-            },
-        },
-    ]
-
-        content = f"""
-        I’m an AI assistant for network engineers, designed to make your job easier by interacting directly with network devices through specific function calls. Here’s how I operate:
-
-        Function Specificity: Use each function exactly for its intended purpose. For example, use get_info_from_devices to retrieve status and information with "show" commands. This function is not for configuring or changing device settings.
-
-        Information Completeness: Don't guess if you don’t have enough info to execute a function. If you need a switch name or IP address and it’s missing, ask for it: "Please provide the switch name or IP address to proceed." Use the switch name as the primary identifier if it's provided.
-
-        Action Restrictions: If there's no dedicated function for a requested action, or if it's beyond my capabilities (like configuring a device), explain the limitation politely: "I'm sorry, but configuring devices directly is beyond my current capabilities. My functions are limited to executing 'show' commands to gather information."
-
-        Guidance and Clarity: Be clear about what functions I can perform and what information I need. If a request is incomplete, provide a brief description of the missing details. For example, if asked to log in or check a switch, I'll interpret it as a status query or device check request.
-
-        Adherence to Scope: Stick to what I’m designed to do. Don’t perform functions or provide assistance beyond my scope, no matter the request.
-
-        Additionally, I can log into switches and perform checks or verifications. If you need me to check or verify something, I'll find and execute the right function. When using show commands, I’ll automatically know and use the correct command without asking you which one.
-
-        My goal is to help network engineers be more efficient while ensuring safety, accuracy, and adherence to procedures. If unsure, I’ll seek clarity or more information rather than guessing. If a command isn't specified, I'll suggest one and use it. If I need to comment, I'll keep it brief unless you ask for more detail.
-                
-        I SHOULD ALWAYS CONSIDER CHAT HISTORY:'''
-        {chat_history}
-        '''
-        
-        FUNCTION CALLING RULES:'''
-        If user requests to check someting on the switches it means you should use get_info_from_devices
-        If user request to configure somwthing on the switches it means you should use configure_devices
-        '''
-        """
-
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo-16k",
-            tools=tools,
-            messages=[
-                {"role": "system", "content": content},
-                {"role": "user", "content": user_input},
-            ],
-        )
-
-        ai_response = response.choices[0].message.content
-        tool_calls = response.choices[0].message.tool_calls
-
-        if tool_calls:
-            function_name = tool_calls[0].function.name
-            arguments = json.loads(tool_calls[0].function.arguments)
-            arguments["function_name"] = function_name
-            arguments["chat_history"] = chat_history
-            follow_up_response = self.function_run(user_input, **arguments)
-            follow_up_content = follow_up_response.choices[0].message.content
-            return follow_up_content
-        else:
-            return ai_response
-
-    def function_run(self, user_input, **arguments):
-        function_map = {
+        with timed("history"):
+            chat_history = self.history.compact(chat_history)
+        query = self.decision_query(user_input, chat_history)
+
+        cacheable = classify(user_input)[0] != "configure"
+
+        # the fast path replaces the first decision call with a locally built tool call
+        with timed("route"):
+            routed = self.router.route(user_input) if self.router else None
+        if routed:
+            self.add_tool_results(query, None, routed, self.run_tools(routed), user_input)
+
+        for round_number in range(MAX_TOOL_ROUNDS):
+            started = time.monotonic()
+            stage = "decision" if round_number == 0 and not routed else "answer"
+            response = self.complete(query, cacheable, stage)
+            if round_number == 0 and not routed and self.router:
+                self.router.record_decision(time.monotonic() - started)
+            message = response.choices[0].message
+            if not message.tool_calls:
+                return message.content
+
+            tool_calls = [tool_call_dict(tool_call) for tool_call in message.tool_calls]
+            cacheable = cacheable and not changes_configuration(tool_calls)
+            self.add_tool_results(query, message.content, tool_calls, self.run_tools(tool_calls), user_input)
+
+        # out of tool rounds, the model has to answer with what it has
+        response = self.complete(dict(query, tool_choice="none"), cacheable, "answer")
+        return response.choices[0].message.content
+
+    def complete(self, query, cacheable=True, stage="decision"):
+        """chat.completions.create served from the LLM cache when the request allows it."""
+        self.prompts.fit(query)
+        if not cacheable or self.llm_cache is None:
+            with timed(stage, model=query["model"]):
+                return self.client.chat.completions.create(**query)
+        cached = self.llm_cache.get(query)
+        if cached is not None:
+            cached = ChatCompletion.model_validate(cached)
+            if cacheable_response(cached):
+                return cached
+        with timed(stage, model=query["model"]):
+            response = self.client.chat.completions.create(**query)
+        # the question alone can't tell whether the model decides to configure, the response can
+        if cacheable_response(response):
+            self.llm_cache.set(query, response.model_dump())
+        return response
+
+    def decision_query(self, user_input, chat_history):
+        return self.prompts.build(user_input, chat_history)
+
+    def tool_map(self):
+        return {
             "get_info_from_devices": self.get_info_from_devices,
             "configure_devices": self.configure_devices,
         }
-        function_name = arguments.get("function_name")
-        chat_history = arguments.get("chat_history")
-        if function_name in function_map:
-            func_to_call = function_map[function_name]
-            response_from_fc = func_to_call(**arguments)
-            system_prompt = f"""I am an AI assistant specializing in Cisco networking. 
-            I receive statuses that indicate whether configurations on switches have 
-            been successful. I interpret these statuses and respond accordingly. 
-            Each status update includes a response code and the type of operation, 
-            such as 'cli_conf' for configurations or 'cli_show' for show commands. 
-            My responsibility is to interpret these updates and provide a clear, 
-            human-like response based on the question, system message, 
-            and output status.
-                    
-                    ALWAYS TAKE UNSER CONSIDERATION CHAT HISTORY:
-                    {chat_history}
-                    """
-            follow_up_query = {
-                "model": "gpt-3.5-turbo",
-                f"messages": [
-                    {"role": "system", "content": system_prompt,},
-                    {"role": "user", "content": user_input},
-                    {"role": "assistant", "content": str(response_from_fc)},
-                ],
-            }
-            follow_up_response = self.client.chat.completions.create(**follow_up_query)
-            return follow_up_response
-        else:
-            return f"Function {function_name} is not recognized or not implemented."
 
-    def configure_devices(self, **kwargs):
-        switchuser = os.getenv("CISCO_USER")
-        switchpassword = os.getenv("CISCO_PASSWD")
+    def run_tools(self, tool_calls):
+        with ThreadPoolExecutor(max_workers=len(tool_calls)) as pool:
+            return list(pool.map(self.run_tool, tool_calls))
+
+    def run_tool(self, tool_call):
+        function_name = tool_call["function"]["name"]
+        function_map = self.tool_map()
+        if function_name not in function_map:
+            return {"error": f"Function {function_name} is not recognized or not implemented."}
+        try:
+            arguments = json.loads(tool_call["function"]["arguments"])
+            with timed("tool", tool=function_name):
+                return function_map[function_name](**arguments)
+        except Exception as e:
+            return {"error": f"Function {function_name} failed: {e}"}
+
+    def add_tool_results(self, query, content, tool_calls, results, user_input):
+        """Append the assistant's tool calls and one tool message per result to the query."""
+        query["messages"].append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+        for tool_call, result in zip(tool_calls, results):
+            if "error" not in result:
+                # outputs already in this request's messages go to the model as differences only
+                changes = None
+                if self.changes is not None and tool_call["function"]["name"] == "get_info_from_devices":
+                    changes = self.changes.track(result, query["messages"])
+                result = compact_result(result, user_input, changes, self.device_words(result))
+            query["messages"].append({
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "content": json.dumps(result),
+            })
+
+    def device_words(self, result):
+        """Names, aliases and addresses of the devices in a result, which are not row filters."""
+        words = set()
+        for name in result:
+            device = self.inventory.get(name)
+            words.add(name)
+            if device is not None:
+                words.update([device.name, device.host, device.address, *device.aliases])
+        return words
+
+    def targets(self, device_ips):
+        """Device names for the device_ips of a tool call, with inventory selectors expanded."""
+        return self.inventory.expand(parse_device_ips(device_ips))
 
-        device_ips = kwargs.get("device_ips")
+    def configure_devices(self, **kwargs):
+        device_ips = self.targets(kwargs.get("device_ips"))
         configuration_cmd = kwargs.get("configuration_cmd")
-        
-        command_string = " ; ".join(configuration_cmd)
-
-        if isinstance(device_ips, list) and device_ips:
-            device_ip = device_ips[0]
-        elif isinstance(device_ips, str):
-            device_ip = device_ips
-        else:
-            raise ValueError("device_ips must be a list with at least one element or a string.")
-
-        url = f"https://{device_ip}/ins"
-        myheaders = {"content-type": "application/json"}
-
-        payload = {
-            "ins_api": {
-                "version": "1.0",
-                "type": "cli_conf",
-                "chunk": "0",
-                "sid": "1",
-                "input": command_string,
-                "output_format": "json",
-                "rollback": "rollback-on-error"
-            }
-        }
 
-        response = requests.post(
-            url,
-            data=json.dumps(payload),
-            headers=myheaders,
-            auth=(switchuser, switchpassword),
-            verify=False,
-        )
-
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {
-                "error": "Failed to execute command",
-                "status_code": response.status_code,
-                "details": response.text,
-            }
+        if not CONFIG_PRECHECK:
+            return self.nxapi.configure(device_ips, configuration_cmd)
 
-    def get_info_from_devices(self, **kwargs):
-        switchuser = os.getenv("CISCO_USER")
-        switchpassword = os.getenv("CISCO_PASSWD")
+        # only the commands missing from a device's running config are pushed
+        outputs = self.nxapi.show(device_ips, [PRECHECK_COMMAND], use_cache=False)
+        results, groups = group_plans(outputs, device_ips, configuration_cmd)
+        for push, (targets, missing, present) in groups.items():
+            for device, response in self.nxapi.configure(targets, list(push)).items():
+                results[device] = applied_entry(response, missing, present)
+        return {device: results[device] for device in device_ips}
 
-        device_ips = kwargs.get("device_ips")
+    def get_info_from_devices(self, **kwargs):
+        device_ips = self.targets(kwargs.get("device_ips"))
         show_cmd = kwargs.get("show_cmd")
 
-        if isinstance(device_ips, list) and device_ips:
-            device_ip = device_ips[0]
-        elif isinstance(device_ips, str):
-            device_ip = device_ips
-        else:
-            raise ValueError("device_ips must be a list with at least one element or a string.")
-
-        url = f"https://{device_ip}/ins"
-        myheaders = {"content-type": "application/json"}
-
-        payload = {
-            "ins_api": {
-                "version": "1.0",
-                "type": "cli_show_ascii",
-                "chunk": "0",
-                "sid": "1",
-                "input": show_cmd,
-                "output_format": "json",
-            }
-        }
-
-        response = requests.post(
-            url,
-            data=json.dumps(payload),
-            headers=myheaders,
-            auth=(switchuser, switchpassword),
-            verify=False,
-        )
-
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {
-                "error": "Failed to execute command",
-                "status_code": response.status_code,
-                "details": response.text,
-            }
+        if not self.structured:
+            return self.nxapi.show(device_ips, show_cmd)
+
+        results = self.nxapi.show(device_ips, show_cmd, cmd_type="cli_show")
+        for device, failed in self.text_fallback(results).items():
+            results[device].update(self.nxapi.show(device, failed)[device])
+        return results
+
+    def text_fallback(self, results):
+        """Commands without JSON output support, to be asked again as plain text."""
+        fallback = {}
+        for device, outputs in results.items():
+            if "error" in outputs:
+                continue
+            failed = [command for command, output in outputs.items() if str(output.get("code")) != "200"]
+            if failed:
+                fallback[device] = failed
+        return fallback
 
 # Example usage
 if __name__ == "__main__":
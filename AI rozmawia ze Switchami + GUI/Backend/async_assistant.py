@@ -0,0 +1,231 @@
+import json
+import time
+import asyncio
+import functools
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from assistant import MAX_TOOL_ROUNDS, NetworkAssistant, cacheable_response, changes_configuration, tool_call_dict
+from nxapi import parse_commands
+from nxapi_async import create_async_client
+from poller import SNAPSHOT_MAX_AGE
+from router import classify
+from ai_fresh.metrics import record, timed
+from rollout import ROLLOUT_MIN_DEVICES, Rollout
+from precheck import CONFIG_PRECHECK, configure_missing
+
+
+class AsyncNetworkAssistant(NetworkAssistant):
+    """
+    NetworkAssistant doing all OpenAI and NX-API I/O with asyncio, meant to
+    be created once per app and shared by concurrent requests. Prompts and
+    tools are the same as in the synchronous assistant.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.snapshots = None
+
+    def make_client(self, api_key):
+        return AsyncOpenAI(api_key=api_key)
+
+    def make_nxapi(self):
+        return create_async_client()
+
+    async def make_decision(self, user_input, chat_history):
+        with timed("history"):
+            chat_history = self.history.compact(chat_history)
+        query = self.decision_query(user_input, chat_history)
+
+        cacheable = classify(user_input)[0] != "configure"
+
+        with timed("route"):
+            routed = self.router.route(user_input) if self.router else None
+        if routed:
+            results = await asyncio.gather(*(self.run_tool(tool_call) for tool_call in routed))
+            self.add_tool_results(query, None, routed, results, user_input)
+
+        for round_number in range(MAX_TOOL_ROUNDS):
+            started = time.monotonic()
+            stage = "decision" if round_number == 0 and not routed else "answer"
+            response = await self.complete(query, cacheable, stage)
+            if round_number == 0 and not routed and self.router:
+                self.router.record_decision(time.monotonic() - started)
+            message = response.choices[0].message
+            if not message.tool_calls:
+                return message.content
+
+            tool_calls = [tool_call_dict(tool_call) for tool_call in message.tool_calls]
+            cacheable = cacheable and not changes_configuration(tool_calls)
+            results = await asyncio.gather(*(self.run_tool(tool_call) for tool_call in tool_calls))
+            self.add_tool_results(query, message.content, tool_calls, results, user_input)
+
+        response = await self.complete(dict(query, tool_choice="none"), cacheable, "answer")
+        return response.choices[0].message.content
+
+    async def complete(self, query, cacheable=True, stage="decision"):
+        self.prompts.fit(query)
+        if not cacheable or self.llm_cache is None:
+            with timed(stage, model=query["model"]):
+                return await self.client.chat.completions.create(**query)
+        cached = await self.cache_call(self.llm_cache.get, query)
+        if cached is not None:
+            cached = ChatCompletion.model_validate(cached)
+            if cacheable_response(cached):
+                return cached
+        with timed(stage, model=query["model"]):
+            response = await self.client.chat.completions.create(**query)
+        if cacheable_response(response):
+            await self.cache_call(self.llm_cache.set, query, response.model_dump())
+        return response
+
+    async def cache_call(self, method, *args):
+        # the SQLite store of a persistent cache is read and written in a thread, off the event loop
+        if self.llm_cache.persistent:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def run_tool(self, tool_call, on_result=None):
+        function_name = tool_call["function"]["name"]
+        function_map = self.tool_map()
+        if function_name not in function_map:
+            return {"error": f"Function {function_name} is not recognized or not implemented."}
+        try:
+            arguments = json.loads(tool_call["function"]["arguments"])
+            with timed("tool", tool=function_name):
+                return await function_map[function_name](on_result=on_result, **arguments)
+        except Exception as e:
+            return {"error": f"Function {function_name} failed: {e}"}
+
+    async def configure_devices(self, **kwargs):
+        device_ips = self.targets(kwargs.get("device_ips"))
+        configuration_cmd = kwargs.get("configuration_cmd")
+
+        precheck = functools.partial(configure_missing, self.nxapi) if CONFIG_PRECHECK else None
+
+        try:
+            # large changes go out canary first and in waves, stopping when too many devices fail
+            if len(device_ips) >= ROLLOUT_MIN_DEVICES:
+                report = await Rollout(self.nxapi, precheck=precheck).run(device_ips, configuration_cmd, kwargs.get("on_result"))
+                return report["devices"]
+            if precheck is not None:
+                return await precheck(device_ips, configuration_cmd, kwargs.get("on_result"))
+            return await self.nxapi.configure(device_ips, configuration_cmd, kwargs.get("on_result"))
+        finally:
+            await self.forget_snapshots(device_ips)
+
+    async def forget_snapshots(self, device_ips):
+        """Snapshots of configured devices are stale, the next question about them goes to the device."""
+        if self.snapshots is not None:
+            await asyncio.to_thread(self.snapshots.invalidate, *device_ips)
+
+    async def get_info_from_devices(self, **kwargs):
+        device_ips = self.targets(kwargs.get("device_ips"))
+        show_cmd = parse_commands(kwargs.get("show_cmd"))
+        on_result = kwargs.get("on_result")
+
+        # devices polled recently enough are answered from their snapshots
+        results = {}
+        max_age = kwargs.get("max_age")
+        if max_age is None:
+            max_age = SNAPSHOT_MAX_AGE
+        if self.snapshots is not None:
+            results = await asyncio.to_thread(self.snapshots.lookup, device_ips, show_cmd, max_age)
+            for device, outputs in results.items():
+                if on_result is not None:
+                    on_result(device, outputs)
+        live = [device for device in device_ips if device not in results]
+        if live:
+            # max_age 0 asks for the live state, the show cache is skipped as well
+            results.update(await self.query_devices(live, show_cmd, on_result, use_cache=max_age != 0))
+        return {device: results[device] for device in device_ips}
+
+    async def query_devices(self, device_ips, show_cmd, on_result=None, use_cache=True):
+        if not self.structured:
+            return await self.nxapi.show(device_ips, show_cmd, on_result=on_result, use_cache=use_cache)
+
+        results = await self.nxapi.show(device_ips, show_cmd, cmd_type="cli_show", on_result=on_result, use_cache=use_cache)
+        fallback = self.text_fallback(results)
+        outputs = await asyncio.gather(*(
+            self.nxapi.show(device, failed, use_cache=use_cache) for device, failed in fallback.items()
+        ))
+        for device, output in zip(fallback, outputs):
+            results[device].update(output[device])
+        return results
+
+    async def stream_decision(self, user_input, chat_history):
+        """
+        Same flow as make_decision, yielding progress events as it goes:
+        deciding, querying (per device), device_done (per device), token
+        (pieces of the answer) and done.
+        """
+        yield {"event": "deciding"}
+        with timed("history"):
+            chat_history = self.history.compact(chat_history)
+        query = self.decision_query(user_input, chat_history)
+
+        with timed("route"):
+            routed = self.router.route(user_input) if self.router else None
+
+        for round_number in range(MAX_TOOL_ROUNDS + 1):
+            content = []
+            if round_number == 0 and routed:
+                tool_calls = routed
+            else:
+                started = time.monotonic()
+                stage = "decision" if round_number == 0 else "answer"
+                extra = {"tool_choice": "none"} if round_number == MAX_TOOL_ROUNDS else {}
+                self.prompts.fit(query)
+                stream = await self.client.chat.completions.create(stream=True, **extra, **query)
+                calls = {}
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        if not content:
+                            record("first_token", time.monotonic() - started, model=query["model"])
+                        content.append(delta.content)
+                        yield {"event": "token", "text": delta.content}
+                    # tool calls arrive in pieces, indexed by their position
+                    for call in delta.tool_calls or []:
+                        entry = calls.setdefault(call.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+                        if call.id:
+                            entry["id"] = call.id
+                        if call.function and call.function.name:
+                            entry["function"]["name"] += call.function.name
+                        if call.function and call.function.arguments:
+                            entry["function"]["arguments"] += call.function.arguments
+                record(stage, time.monotonic() - started, model=query["model"])
+                if round_number == 0 and self.router:
+                    self.router.record_decision(time.monotonic() - started)
+                if not calls:
+                    yield {"event": "done"}
+                    return
+                tool_calls = [calls[index] for index in sorted(calls)]
+
+            for tool_call in tool_calls:
+                try:
+                    devices = self.targets(json.loads(tool_call["function"]["arguments"]).get("device_ips"))
+                except (ValueError, AttributeError):
+                    devices = []
+                for device in devices:
+                    yield {"event": "querying", "device": device, "tool": tool_call["function"]["name"]}
+
+            queue = asyncio.Queue()
+
+            def on_result(device, result):
+                status = "error" if "error" in result or result.get("status") in ("failed", "skipped") else "ok"
+                queue.put_nowait({"event": "device_done", "device": device, "status": status})
+
+            task = asyncio.ensure_future(asyncio.gather(*(self.run_tool(tool_call, on_result) for tool_call in tool_calls)))
+            task.add_done_callback(lambda _: queue.put_nowait(None))
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            self.add_tool_results(query, "".join(content) or None, tool_calls, task.result(), user_input)
+
+    async def aclose(self):
+        await self.nxapi.aclose()
+        await self.client.close()
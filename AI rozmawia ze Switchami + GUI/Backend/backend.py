@@ -1,31 +1,210 @@
 import os
+import asyncio
+import functools
+from typing import Optional
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from assistant import NetworkAssistant  # Adjust the import based on your file structure
+from async_assistant import AsyncNetworkAssistant  # Adjust the import based on your file structure
+from poller import POLLER_ENABLED, Poller, SnapshotStore
+from ai_fresh.sessions import SessionStore
+from rollout import ROLLOUT_CANARY, ROLLOUT_CONCURRENCY, ROLLOUT_MAX_FAILURE_RATE, ROLLOUT_WAVE_SIZE, Rollout
+from precheck import CONFIG_PRECHECK, configure_missing
+from ai_fresh.framing import MEDIA_TYPE, framed
+from prompts import PromptTooLarge
+from ai_fresh import metrics
+import admission
 
 load_dotenv()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one assistant with its OpenAI and NX-API connection pools for the whole app
+    api_key = os.getenv("OPENAI_API_KEY")
+    app.state.assistant = AsyncNetworkAssistant(api_key=api_key)
+    app.state.sessions = SessionStore()
+    prompts = app.state.assistant.prompts
+    metrics.gauge("prompt_tokens", "Tokens of the last model request, per section.", "section", lambda: prompts.last_stats)
+    history = app.state.assistant.history
+    metrics.gauge("history_tokens", "Chat history of the last model request, tokens and turns.", "stat", history.gauge_values)
+    limiter = app.state.assistant.nxapi.limiter
+    if limiter is not None:
+        metrics.gauge("nxapi_queue_depth", "NX-API requests waiting for a slot, per session.", "session", limiter.depth)
+    llm_cache = app.state.assistant.llm_cache
+    if llm_cache is not None:
+        metrics.gauge("llm_cache", "Completion cache entries, hits and misses.", "counter", llm_cache.stats)
+    poller = None
+    if POLLER_ENABLED:
+        app.state.assistant.snapshots = SnapshotStore()
+        poller = Poller(app.state.assistant, app.state.assistant.snapshots)
+        poller.start()
+    yield
+    if poller is not None:
+        await poller.stop()
+    await app.state.assistant.aclose()
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(metrics.server_timing_middleware)
+
+@app.middleware("http")
+async def session_middleware(request: Request, call_next):
+    # NX-API slots are shared fairly between sessions, a client without a session id counts as one
+    admission.session_id.set(request.headers.get("x-session-id") or (request.client.host if request.client else "anonymous"))
+    return await call_next(request)
 
 class QuestionRequest(BaseModel):
     question: str
-    chat_history: str
+    # with a session id the history is kept by the backend and chat_history is not needed
+    chat_history: str = ""
+    session_id: Optional[str] = None
 
 class AnswerResponse(BaseModel):
     reply: str
+    session_id: Optional[str] = None
+
+class RolloutRequest(BaseModel):
+    device_ips: list[str]
+    configuration_cmd: list[str]
+    canary: int = ROLLOUT_CANARY
+    wave_size: int = ROLLOUT_WAVE_SIZE
+    concurrency: int = ROLLOUT_CONCURRENCY
+    max_failure_rate: float = ROLLOUT_MAX_FAILURE_RATE
+    # push only the commands missing from each device's running config
+    precheck: bool = CONFIG_PRECHECK
+
+def get_session(request: QuestionRequest, http_request: Request):
+    """Stored session of the request, or None for clients still sending their whole chat_history."""
+    if request.chat_history and not request.session_id:
+        return None
+    return http_request.app.state.sessions.get(request.session_id)
 
 @app.post("/ask/", response_model=AnswerResponse)
-async def ask(request: QuestionRequest):
+async def ask(request: QuestionRequest, http_request: Request):
     if not request.question:
         raise HTTPException(status_code=400, detail="Question content is empty")
     
-    api_key = os.getenv("OPENAI_API_KEY")
-    assistant_ai = NetworkAssistant(api_key=api_key)
+    assistant_ai = http_request.app.state.assistant
+    session = get_session(request, http_request)
+    chat_history = session.history() if session else request.chat_history
     print(request.chat_history)
-    answer = assistant_ai.make_decision(request.question, request.chat_history)
+    try:
+        answer = await assistant_ai.make_decision(request.question, chat_history)
+    except PromptTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     print("answer: ", answer)
     
     if not answer:
         raise HTTPException(status_code=500, detail="Failed to get a response from the assistant")
     
-    return AnswerResponse(reply=answer)
+    if session:
+        session.append("Human", request.question)
+        session.append("AI", answer)
+    return AnswerResponse(reply=answer, session_id=session.id if session else None)
+
+@app.get("/sessions/stats/")
+async def sessions_stats(http_request: Request):
+    return http_request.app.state.sessions.stats()
+
+@app.get("/router/stats/")
+async def router_stats(http_request: Request):
+    router = http_request.app.state.assistant.router
+    return router.stats() if router else {}
+
+@app.get("/nxapi/stats/")
+async def nxapi_stats(http_request: Request):
+    nxapi = http_request.app.state.assistant.nxapi
+    llm_cache = http_request.app.state.assistant.llm_cache
+    return {
+        "show_cache": nxapi.cache.stats() if nxapi.cache else {},
+        "singleflight": nxapi.inflight.stats() if nxapi.inflight else {},
+        "admission": nxapi.limiter.stats() if nxapi.limiter else {},
+        "llm_cache": llm_cache.stats() if llm_cache else {},
+    }
+
+@app.get("/changes/")
+async def changes(http_request: Request, device: Optional[str] = None, limit: int = 100):
+    tracker = http_request.app.state.assistant.changes
+    if tracker is None:
+        return {"stats": {}, "history": []}
+    return {"stats": tracker.stats(), "history": tracker.history(device, limit)}
+
+@app.post("/rollout/")
+async def rollout(request: RolloutRequest, http_request: Request):
+    assistant_ai = http_request.app.state.assistant
+    try:
+        devices = assistant_ai.targets(request.device_ips)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not request.configuration_cmd:
+        raise HTTPException(status_code=400, detail="Configuration commands are empty")
+
+    try:
+        engine = Rollout(
+            assistant_ai.nxapi,
+            canary=request.canary,
+            wave_size=request.wave_size,
+            concurrency=request.concurrency,
+            max_failure_rate=request.max_failure_rate,
+            precheck=functools.partial(configure_missing, assistant_ai.nxapi) if request.precheck else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await engine.run(devices, request.configuration_cmd)
+    finally:
+        await assistant_ai.forget_snapshots(devices)
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/ask/stream/")
+async def ask_stream(request: QuestionRequest, http_request: Request):
+    if not request.question:
+        raise HTTPException(status_code=400, detail="Question content is empty")
+
+    assistant_ai = http_request.app.state.assistant
+    session = get_session(request, http_request)
+    chat_history = session.history() if session else request.chat_history
+
+    queue = asyncio.Queue()
+
+    async def produce():
+        # runs the assistant while framed() numbers its events and sends heartbeats during tool calls
+        answer = []
+        done = {}
+        try:
+            async for event in assistant_ai.stream_decision(request.question, chat_history):
+                fields = dict(event)
+                kind = fields.pop("event")
+                if kind == "token":
+                    answer.append(fields["text"])
+                    await queue.put(fields["text"])
+                elif kind == "done":
+                    done = fields
+                else:
+                    await queue.put({"type": kind, **fields})
+        except Exception as e:
+            # PromptTooLarge included, the stream has started and can only end with an error frame
+            await queue.put(e)
+            return
+        if session:
+            session.append("Human", request.question)
+            session.append("AI", "".join(answer))
+            done["session_id"] = session.id
+        # the Server-Timing header is sent before the stream, the full breakdown comes with done
+        if metrics.SERVER_TIMING:
+            done["timings"] = metrics.current_timings()
+        await queue.put(done)
+
+    async def generate():
+        producer = asyncio.ensure_future(produce())
+        try:
+            async for frame in framed(queue):
+                yield frame
+        finally:
+            producer.cancel()
+    return StreamingResponse(generate(), media_type=MEDIA_TYPE)
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import difflib
+import threading
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+from show_cache import normalize_command
+from nxos_tables import MAX_ROWS, parse_tables
+from admission import session_id
+
+load_dotenv()
+
+CHANGES_ENABLED = os.getenv("CHANGES_ENABLED", "1") == "1"
+CHANGE_BASELINES = int(os.getenv("CHANGE_BASELINES", "10000"))
+CHANGE_HISTORY = int(os.getenv("CHANGE_HISTORY", "1000"))
+
+# columns tried first when matching rows of two versions of a table
+KEY_HINTS = ("id", "name", "interface", "port", "addr")
+
+
+def key_column(old_rows, new_rows):
+    """A column present and unique in the rows of both versions, or None."""
+    rows = old_rows + new_rows
+    if not rows:
+        return None
+    columns = [column for column in rows[0] if all(column in row for row in rows)]
+    columns.sort(key=lambda column: next(
+        (i for i, hint in enumerate(KEY_HINTS) if hint in column.lower()), len(KEY_HINTS)
+    ))
+    for column in columns:
+        if all(len({str(row[column]) for row in part}) == len(part) for part in (old_rows, new_rows)):
+            return column
+    return None
+
+
+def diff_rows(old_rows, new_rows, max_rows=MAX_ROWS):
+    column = key_column(old_rows, new_rows)
+    if column is None:
+        # no usable key, rows are compared as a whole
+        old = [json.dumps(row, sort_keys=True) for row in old_rows]
+        new = [json.dumps(row, sort_keys=True) for row in new_rows]
+        added = [row for row, dump in zip(new_rows, new) if dump not in old]
+        removed = [row for row, dump in zip(old_rows, old) if dump not in new]
+        changed = []
+    else:
+        old = {str(row[column]): row for row in old_rows}
+        new = {str(row[column]): row for row in new_rows}
+        added = [row for key, row in new.items() if key not in old]
+        removed = [row for key, row in old.items() if key not in new]
+        changed = []
+        for key, row in new.items():
+            if key not in old or old[key] == row:
+                continue
+            columns = [c for c in dict.fromkeys([*old[key], *row]) if old[key].get(c) != row.get(c)]
+            changed.append({
+                column: row[column],
+                "before": {c: old[key].get(c) for c in columns},
+                "after": {c: row.get(c) for c in columns},
+            })
+
+    diff = {}
+    for name, rows in (("added", added), ("removed", removed), ("changed", changed)):
+        if rows:
+            diff[name] = rows[:max_rows]
+    return diff
+
+
+def diff_body(old, new):
+    """
+    Difference between two outputs of a command, None when they are equal.
+    cli_show bodies are compared table by table, matching rows by a key
+    column, text bodies line by line.
+    """
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        old, new = parse_tables(old), parse_tables(new)
+        diff = {}
+        fields = {
+            key: {"before": old["fields"].get(key), "after": new["fields"].get(key)}
+            for key in dict.fromkeys([*old["fields"], *new["fields"]])
+            if old["fields"].get(key) != new["fields"].get(key)
+        }
+        if fields:
+            diff["fields"] = fields
+        tables = {}
+        for name in dict.fromkeys([*old["tables"], *new["tables"]]):
+            table = diff_rows(old["tables"].get(name, []), new["tables"].get(name, []))
+            if table:
+                tables[name] = table
+        if tables:
+            diff["tables"] = tables
+        return diff or None
+
+    lines = list(difflib.unified_diff(str(old).splitlines(), str(new).splitlines(), n=0, lineterm=""))
+    diff = {
+        "added": [line[1:] for line in lines if line.startswith("+") and not line.startswith("+++")][:MAX_ROWS],
+        "removed": [line[1:] for line in lines if line.startswith("-") and not line.startswith("---")][:MAX_ROWS],
+    }
+    return {key: value for key, value in diff.items() if value} or None
+
+
+def shown_versions(messages):
+    """
+    Versions of outputs already in the tool messages of a request, as
+    {(device, command): {version, ...}}. Tool messages that are not whole
+    JSON (cut to fit the prompt) don't count.
+    """
+    shown = {}
+    for message in messages:
+        if message.get("role") != "tool":
+            continue
+        try:
+            result = json.loads(message["content"])
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(result, dict):
+            continue
+        for device, outputs in result.items():
+            if not isinstance(outputs, dict):
+                continue
+            for command, entry in outputs.items():
+                if isinstance(entry, dict) and "version" in entry:
+                    shown.setdefault((device.lower(), normalize_command(command)), set()).add(entry["version"])
+    return shown
+
+
+class Baseline:
+    __slots__ = ("version", "taken", "body")
+
+    def __init__(self, version, taken, body):
+        self.version = version
+        self.taken = taken
+        self.body = body
+
+
+class ChangeTracker:
+    """
+    Last successful output per device and normalized command (the baseline)
+    and a log of the differences found when a command is run again. When
+    the baseline is already in the request's messages the model only needs
+    the difference, see compact_result. The model never sees outputs of
+    earlier requests (the chat history keeps only the text of the turns),
+    so a baseline from another request doesn't count. Baselines are evicted
+    least recently used first.
+    """
+
+    def __init__(self, max_baselines=CHANGE_BASELINES, history=CHANGE_HISTORY):
+        self.max_baselines = max_baselines
+        self.observed = 0
+        self.unchanged = 0
+        self.changed = 0
+        self._baselines = OrderedDict()
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def observe(self, device, command, body, session=None):
+        """
+        Make body the baseline of (device, command) and return its version
+        and what changed against the previous one as {"version",
+        "previous", "baseline_age", "diff"}; previous, baseline_age and diff
+        are None when there was no previous baseline.
+        """
+        session = session or session_id.get()
+        key = (device.lower(), normalize_command(command))
+        now = time.time()
+        with self._lock:
+            self.observed += 1
+            previous = self._baselines.get(key)
+            if previous is None:
+                self._store(key, Baseline(1, now, body))
+                return {"version": 1, "previous": None, "baseline_age": None, "diff": None}
+
+            diff = diff_body(previous.body, body)
+            change = {"version": previous.version, "previous": previous.version,
+                      "baseline_age": round(now - previous.taken, 1), "diff": diff}
+            if diff is None:
+                self.unchanged += 1
+                self._baselines.move_to_end(key)
+                return change
+
+            self.changed += 1
+            baseline = Baseline(previous.version + 1, now, body)
+            self._store(key, baseline)
+            self._history.append({
+                "device": key[0],
+                "command": key[1],
+                "version": baseline.version,
+                "time": now,
+                "session": session,
+                "diff": diff,
+            })
+            return dict(change, version=baseline.version)
+
+    def _store(self, key, baseline):
+        self._baselines[key] = baseline
+        self._baselines.move_to_end(key)
+        while len(self._baselines) > self.max_baselines:
+            self._baselines.popitem(last=False)
+
+    def track(self, result, messages=(), session=None):
+        """
+        Observe every successful output of a get_info_from_devices result,
+        returning the changes as {device: {command: change}}. change["seen"]
+        tells whether the previous baseline is in messages, the messages of
+        the request the result goes to.
+        """
+        shown = shown_versions(messages)
+        changes = {}
+        for device, outputs in result.items():
+            if not isinstance(outputs, dict) or "error" in outputs or "ins_api" in outputs or "wave" in outputs:
+                continue
+            for command, output in outputs.items():
+                if not isinstance(output, dict) or str(output.get("code")) != "200" or output.get("truncated"):
+                    continue
+                change = self.observe(device, command, output.get("body"), session)
+                change["seen"] = change["previous"] in shown.get((device.lower(), normalize_command(command)), ())
+                changes.setdefault(device, {})[command] = change
+        return changes
+
+    def history(self, device=None, limit=100):
+        """Most recent changes first, optionally of one device only."""
+        with self._lock:
+            entries = [entry for entry in reversed(self._history) if device is None or entry["device"] == device.lower()]
+        return entries[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "baselines": len(self._baselines),
+                "observed": self.observed,
+                "unchanged": self.unchanged,
+                "changed": self.changed,
+                "history": len(self._history),
+            }
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_change_tracker():
+    """Return the ChangeTracker shared by every assistant in the process, or None when disabled."""
+    global _tracker
+    if not CHANGES_ENABLED:
+        return None
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = ChangeTracker()
+        return _tracker
@@ -0,0 +1,202 @@
+import os
+import ast
+import json
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+load_dotenv()
+
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "2000"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+HISTORY_MAX_TURN_TOKENS = int(os.getenv("HISTORY_MAX_TURN_TOKENS", "400"))
+SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "500"))
+SUMMARY_LINE_CHARS = 150
+
+# turn types and content prefixes of raw tool output that never go back to the model
+TOOL_TYPES = ("tool", "function")
+TOOL_PREFIXES = ("{'ins_api'", '{"ins_api"')
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+_SUMMARIES_MAX = 256
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+@functools.lru_cache(maxsize=4096)
+def turn_tokens(text):
+    """count_tokens of a turn, remembered since a session's earlier turns come back on every call."""
+    return count_tokens(text)
+
+
+def summarize_turns(summary, turns):
+    """Default summarizer: fold turns into the summary as one short line each."""
+    lines = [summary] if summary else []
+    for turn in turns:
+        text = " ".join(turn["content"].split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS] + "..."
+        lines.append(f"{turn['type']}: {text}")
+    return "\n".join(lines)
+
+
+class HistoryManager:
+    """
+    Keeps the chat history sent to the model under a token budget. The last
+    keep_turns turns go verbatim, older ones are folded into a rolling
+    summary which is extended only with the turns that aged out since the
+    previous call, and raw tool output is dropped.
+    """
+
+    def __init__(self, max_tokens=HISTORY_MAX_TOKENS, keep_turns=HISTORY_KEEP_TURNS,
+                 max_turn_tokens=HISTORY_MAX_TURN_TOKENS, summary_max_tokens=SUMMARY_MAX_TOKENS,
+                 summarize=summarize_turns):
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.max_turn_tokens = max_turn_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summarize = summarize
+        self.last_stats = {}
+
+    def parse(self, chat_history):
+        """Accept the history as a list, JSON, a Python repr of a list or plain text."""
+        if not chat_history:
+            return []
+        if isinstance(chat_history, str):
+            for loads in (json.loads, ast.literal_eval):
+                try:
+                    parsed = loads(chat_history)
+                    break
+                except (ValueError, SyntaxError):
+                    continue
+            else:
+                return [{"type": "Human", "content": chat_history}]
+            chat_history = parsed
+        if not isinstance(chat_history, list):
+            return [{"type": "Human", "content": str(chat_history)}]
+
+        turns = []
+        for message in chat_history:
+            if isinstance(message, dict):
+                turns.append({"type": str(message.get("type", "Human")), "content": str(message.get("content", ""))})
+            else:
+                turns.append({"type": "Human", "content": str(message)})
+        return turns
+
+    def compact(self, chat_history):
+        """
+        Chat history text to send to the model. The stats of the call are
+        kept in last_stats (read by the history_tokens gauge), use
+        compact_with_stats for the stats of one particular call.
+        """
+        text, self.last_stats = self.compact_with_stats(chat_history)
+        return text
+
+    def compact_with_stats(self, chat_history):
+        """Return the chat history text and its stats: turns, summarized_turns, dropped_turns, summary_tokens, total_tokens."""
+        turns = []
+        dropped = 0
+        for turn in self.parse(chat_history):
+            content = turn["content"].strip()
+            if turn["type"].lower() in TOOL_TYPES or content.startswith(TOOL_PREFIXES):
+                dropped += 1
+                continue
+            if turn_tokens(content) > self.max_turn_tokens:
+                content = content[:self.max_turn_tokens * 4] + " [...]"
+            turns.append({"type": turn["type"], "content": content})
+
+        older = turns[:-self.keep_turns] if self.keep_turns else turns
+        recent = turns[len(older):]
+        summary = self._summary(older)
+
+        sizes = [turn_tokens(f"{turn['type']}: {turn['content']}") for turn in recent]
+        summary_tokens = count_tokens(summary) if summary else 0
+        # over budget: the summary shrinks first, then the oldest verbatim turns go
+        while summary and summary_tokens + sum(sizes) > self.max_tokens:
+            summary = summary.split("\n", 1)[1] if "\n" in summary else ""
+            summary_tokens = count_tokens(summary) if summary else 0
+        while recent and summary_tokens + sum(sizes) > self.max_tokens:
+            recent.pop(0)
+            sizes.pop(0)
+            dropped += 1
+
+        stats = {
+            "turns": [{"type": turn["type"], "tokens": size} for turn, size in zip(recent, sizes)],
+            "summarized_turns": len(older),
+            "dropped_turns": dropped,
+            "summary_tokens": summary_tokens,
+            "total_tokens": summary_tokens + sum(sizes),
+        }
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+        if recent:
+            parts.append("\n".join(f"{turn['type']}: {turn['content']}" for turn in recent))
+        return "\n\n".join(parts), stats
+
+    def gauge_values(self):
+        """Numeric values of last_stats for the history_tokens gauge."""
+        stats = self.last_stats
+        if not stats:
+            return {}
+        return {
+            "verbatim_tokens": stats["total_tokens"] - stats["summary_tokens"],
+            "summary_tokens": stats["summary_tokens"],
+            "total_tokens": stats["total_tokens"],
+            "verbatim_turns": len(stats["turns"]),
+            "summarized_turns": stats["summarized_turns"],
+            "dropped_turns": stats["dropped_turns"],
+        }
+
+    def _settings_key(self):
+        """Everything besides the turns a summary depends on, so other settings don't reuse it."""
+        summarize = f"{getattr(self.summarize, '__module__', '')}.{getattr(self.summarize, '__qualname__', repr(self.summarize))}"
+        return json.dumps([summarize, self.max_tokens, self.keep_turns, self.max_turn_tokens,
+                           self.summary_max_tokens, SUMMARY_LINE_CHARS])
+
+    def _summary(self, turns):
+        if not turns:
+            return ""
+        keys = []
+        digest = hashlib.sha1(self._settings_key().encode("utf-8"))
+        for turn in turns:
+            digest.update(json.dumps(turn, sort_keys=True).encode("utf-8"))
+            keys.append(digest.hexdigest())
+
+        # start from the longest prefix summarized on an earlier call
+        done = 0
+        summary = ""
+        with _summaries_lock:
+            for i in range(len(keys), 0, -1):
+                if keys[i - 1] in _summaries:
+                    done = i
+                    summary = _summaries[keys[i - 1]]
+                    _summaries.move_to_end(keys[i - 1])
+                    break
+        if done == len(turns):
+            return summary
+
+        summary = self.summarize(summary, turns[done:])
+        while "\n" in summary and count_tokens(summary) > self.summary_max_tokens:
+            summary = summary.split("\n", 1)[1]
+
+        with _summaries_lock:
+            _summaries[keys[-1]] = summary
+            while len(_summaries) > _SUMMARIES_MAX:
+                _summaries.popitem(last=False)
+        return summary
@@ -0,0 +1,155 @@
+import os
+import csv
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+load_dotenv()
+
+INVENTORY_FILE = os.getenv("INVENTORY_FILE", "")
+RESOLVE_WORKERS = 32
+
+
+class Device:
+    def __init__(self, name, host=None, aliases=(), groups=(), tags=()):
+        self.name = name
+        self.host = host or name
+        self.address = self.host
+        self.aliases = list(aliases)
+        self.groups = list(groups)
+        self.tags = list(tags)
+
+
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split("|") if item.strip()]
+    return [str(item) for item in value]
+
+
+class Inventory:
+    """
+    Known switches with aliases, groups and tags. Names and aliases are
+    indexed for O(1) lookup and addresses are resolved once when the
+    inventory is loaded, not on every device call.
+
+    Targets can be names, aliases, addresses or selectors:
+    group:<name>, tag:<name>, selectors joined with & (intersection) or all.
+    """
+
+    def __init__(self, devices=()):
+        self.devices = {}
+        self._index = {}
+        self._groups = {}
+        self._tags = {}
+        for device in devices:
+            self.add(device)
+
+    def add(self, device):
+        self.devices[device.name] = device
+        for key in [device.name, device.host] + device.aliases:
+            self._index[key.lower()] = device
+        for group in device.groups:
+            self._groups.setdefault(group.lower(), []).append(device.name)
+        for tag in device.tags:
+            self._tags.setdefault(tag.lower(), []).append(device.name)
+
+    def resolve_addresses(self):
+        """Resolve every host name once, in parallel; unresolvable hosts are kept as they are."""
+        def resolve(device):
+            try:
+                device.address = socket.gethostbyname(device.host)
+            except OSError:
+                device.address = device.host
+
+        if self.devices:
+            with ThreadPoolExecutor(max_workers=min(RESOLVE_WORKERS, len(self.devices))) as pool:
+                list(pool.map(resolve, self.devices.values()))
+
+    def get(self, name):
+        return self._index.get(name.lower())
+
+    def address(self, name):
+        device = self.get(name)
+        return device.address if device else name
+
+    def select(self, selector):
+        """Expand one selector into device names, or None if it is not a selector."""
+        selector = selector.strip().lower()
+        if selector == "all":
+            return list(self.devices)
+        if not selector.startswith(("group:", "tag:")):
+            return None
+        selected = None
+        for part in selector.split("&"):
+            kind, _, value = part.strip().partition(":")
+            names = (self._groups if kind == "group" else self._tags).get(value.strip(), [])
+            selected = names if selected is None else [name for name in selected if name in names]
+        return list(selected or [])
+
+    def expand(self, targets):
+        """Turn targets parsed from the tool call into a list of unique device names."""
+        names = []
+        for target in targets:
+            selected = self.select(target)
+            if selected is None:
+                device = self.get(target)
+                selected = [device.name if device else target]
+            for name in selected:
+                if name not in names:
+                    names.append(name)
+        if not names:
+            raise ValueError(f"No devices match {', '.join(targets)}")
+        return names
+
+
+def load_inventory(path=INVENTORY_FILE):
+    """Load the inventory from a YAML or CSV file. Without a file it is empty."""
+    if not path or not os.path.exists(path):
+        return Inventory()
+
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        if yaml is None:
+            raise ImportError("PyYAML is required to load a YAML inventory")
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        rows = data.get("devices", [])
+        if isinstance(rows, dict):
+            rows = [dict(attributes or {}, name=name) for name, attributes in rows.items()]
+
+    inventory = Inventory(
+        Device(
+            name=str(row["name"]),
+            host=row.get("host"),
+            aliases=_as_list(row.get("aliases")),
+            groups=_as_list(row.get("groups")),
+            tags=_as_list(row.get("tags")),
+        )
+        for row in rows
+    )
+    inventory.resolve_addresses()
+    return inventory
+
+
+_inventory = None
+_inventory_lock = threading.Lock()
+
+
+def get_inventory():
+    """Return the inventory shared by every caller in the process."""
+    global _inventory
+    with _inventory_lock:
+        if _inventory is None:
+            _inventory = load_inventory()
+        return _inventory
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+
+
+def _normalize_message(message):
+    message = dict(message)
+    if isinstance(message.get("content"), str):
+        message["content"] = " ".join(message["content"].split())
+    # tool call ids are random, only their order matters
+    message.pop("tool_call_id", None)
+    if message.get("tool_calls"):
+        message["tool_calls"] = [
+            {"name": call["function"]["name"], "arguments": call["function"]["arguments"]}
+            for call in message["tool_calls"]
+        ]
+    return message
+
+
+def request_key(request):
+    """Cache key of a chat.completions.create request: model, normalized messages and a tools hash."""
+    tools = json.dumps(request.get("tools", []), sort_keys=True)
+    key = {
+        "model": request.get("model"),
+        "messages": [_normalize_message(message) for message in request.get("messages", [])],
+        "tools": hashlib.sha256(tools.encode("utf-8")).hexdigest(),
+        "tool_choice": request.get("tool_choice"),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    LRU + TTL cache of completion responses (stored as plain dicts). With a
+    path, entries are also written to SQLite and survive restarts.
+    """
+
+    def __init__(self, max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, path=LLM_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, expires REAL, value TEXT)"
+            )
+            self._db.execute("DELETE FROM completions WHERE expires < ?", (time.time(),))
+            self._db.commit()
+
+    @property
+    def persistent(self):
+        """True when entries are also in SQLite, get and set then do disk I/O."""
+        return self._db is not None
+
+    def get(self, request):
+        key = request_key(request)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires, value FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._entries[key] = entry
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._delete(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, request, value):
+        key = request_key(request)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, expires, value) VALUES (?, ?, ?)",
+                    (key, expires, json.dumps(value)),
+                )
+                self._db.commit()
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._delete(old_key)
+
+    def _delete(self, key):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the LLMCache shared by every assistant in the process, or None when disabled."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
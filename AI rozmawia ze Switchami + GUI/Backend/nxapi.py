@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from show_cache import ShowCache
+from inventory import get_inventory
+from ai_fresh.metrics import timed
+
+load_dotenv()
+
+MAX_WORKERS = int(os.getenv("NXAPI_MAX_WORKERS", "32"))
+POOL_SIZE = int(os.getenv("NXAPI_POOL_SIZE", "4"))
+IDLE_TIMEOUT = float(os.getenv("NXAPI_IDLE_TIMEOUT", "300"))
+TIMEOUT = float(os.getenv("NXAPI_TIMEOUT", "30"))
+MAX_OUTPUT = int(os.getenv("NXAPI_MAX_OUTPUT", "200000"))
+SHOW_CACHE_ENABLED = os.getenv("SHOW_CACHE_ENABLED", "1") == "1"
+# {host} is replaced with the device address, e.g. http://127.0.0.1:8443/ins?device={host} for a lab stand-in
+NXAPI_URL = os.getenv("NXAPI_URL", "https://{host}/ins")
+
+NXAPI_COOKIE = "nxapi_auth"
+
+# commands with outputs large enough to be fetched in NX-API chunk mode
+CHUNKED_COMMANDS = (
+    "show run",
+    "show start",
+    "show mac address-table",
+    "show tech",
+    "show logging",
+)
+
+
+class NxapiError(Exception):
+    pass
+
+
+def parse_device_ips(device_ips):
+    """
+    Normalize device_ips from the tool call into a list of unique targets.
+    The model may pass a list, a single string or several names joined with ;
+    """
+    if isinstance(device_ips, str):
+        device_ips = [device_ips]
+    if not isinstance(device_ips, list) or not device_ips:
+        raise ValueError("device_ips must be a list with at least one element or a string.")
+
+    devices = []
+    for item in device_ips:
+        for device in str(item).split(";"):
+            device = device.strip()
+            if device and device not in devices:
+                devices.append(device)
+    if not devices:
+        raise ValueError("device_ips must be a list with at least one element or a string.")
+    return devices
+
+
+def fan_out(device_ips, func, max_workers=MAX_WORKERS):
+    """
+    Run func(device) for every device in parallel and return results keyed
+    by device. An exception on one device is reported only for that device.
+    """
+    devices = parse_device_ips(device_ips)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(devices)))) as pool:
+        futures = {device: pool.submit(func, device) for device in devices}
+        for device, future in futures.items():
+            try:
+                results[device] = future.result()
+            except Exception as e:
+                results[device] = {
+                    "error": "Failed to execute command",
+                    "details": str(e),
+                }
+    return results
+
+
+def parse_commands(commands):
+    """Split commands given as a list or a ;-joined string into single commands."""
+    if isinstance(commands, str):
+        commands = [commands]
+    return [command.strip() for item in commands for command in str(item).split(";") if command.strip()]
+
+
+def build_payload(cmd_type, commands, **extra):
+    payload = {
+        "ins_api": {
+            "version": "1.0",
+            "type": cmd_type,
+            "chunk": "0",
+            "sid": "1",
+            "input": " ; ".join(commands),
+            "output_format": "json",
+        }
+    }
+    payload["ins_api"].update(extra)
+    return payload
+
+
+def split_outputs(response, commands):
+    """
+    Map a batched NX-API response back to the commands that produced it.
+    Error responses without an ins_api envelope are returned unchanged.
+    """
+    if "ins_api" not in response:
+        return response
+    outputs = response["ins_api"].get("outputs", {}).get("output", [])
+    if isinstance(outputs, dict):
+        outputs = [outputs]
+    results = {}
+    for i, command in enumerate(commands):
+        if i < len(outputs):
+            results[command] = outputs[i]
+        else:
+            results[command] = {"code": None, "msg": "No output returned for this command"}
+    return results
+
+
+class NxapiClient:
+    """
+    NX-API client keeping one keep-alive session per device. Credentials are
+    read once, the nxapi_auth cookie returned by the switch is reused instead
+    of logging in again, and sessions idle for longer than idle_timeout
+    seconds are closed. With a ShowCache, show outputs are served from it
+    and configuring a device drops that device's cached outputs, outputs
+    of show calls started before the change are not cached. With an
+    Inventory, device names are sent to their pre-resolved address.
+    """
+
+    def __init__(self, username=None, password=None, pool_size=POOL_SIZE,
+                 idle_timeout=IDLE_TIMEOUT, timeout=TIMEOUT, verify=False, cache=None,
+                 inventory=None):
+        self.auth = (
+            username or os.getenv("CISCO_USER"),
+            password or os.getenv("CISCO_PASSWD"),
+        )
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.verify = verify
+        self.cache = cache
+        self.inventory = inventory
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._generation_lock = threading.Lock()
+
+    def session(self, device_ip):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(device_ip)
+            if entry is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"content-type": "application/json"})
+                session.verify = self.verify
+                entry = [session, now]
+                self._sessions[device_ip] = entry
+            entry[1] = now
+            return entry[0]
+
+    def _evict_idle(self, now):
+        for device_ip, (session, last_used) in list(self._sessions.items()):
+            if now - last_used > self.idle_timeout:
+                del self._sessions[device_ip]
+                session.close()
+
+    def post(self, device_ip, payload):
+        session = self.session(device_ip)
+        host = self.inventory.address(device_ip) if self.inventory else device_ip
+        url = NXAPI_URL.format(host=host)
+        data = json.dumps(payload)
+
+        # basic auth is only sent until the switch hands out its session cookie
+        auth = None if session.cookies.get(NXAPI_COOKIE) else self.auth
+        with timed("nxapi", device=device_ip):
+            response = session.post(url, data=data, auth=auth, timeout=self.timeout)
+            if response.status_code == 401 and auth is None:
+                session.cookies.clear()
+                response = session.post(url, data=data, auth=self.auth, timeout=self.timeout)
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {
+                "error": "Failed to execute command",
+                "status_code": response.status_code,
+                "details": response.text,
+            }
+
+    def fan_out(self, device_ips, payload, max_workers=MAX_WORKERS):
+        return fan_out(device_ips, lambda device_ip: self.post(device_ip, payload), max_workers)
+
+    def show(self, device_ips, commands, cmd_type="cli_show_ascii", use_cache=True):
+        """
+        Run all show commands in a single /ins request per device and return
+        the outputs keyed by device and then by command. Commands with large
+        outputs are fetched separately as text in chunk mode. use_cache=False
+        asks the devices even for outputs in the show cache.
+        """
+        commands = parse_commands(commands)
+        chunked = [command for command in commands if command.startswith(CHUNKED_COMMANDS)]
+        batched = [command for command in commands if command not in chunked]
+
+        def run(device_ip):
+            generation = self._generation(device_ip)
+            results = {}
+            if self.cache is not None and use_cache:
+                for command in commands:
+                    cached = self.cache.get(device_ip, command, cmd_type)
+                    if cached is not None:
+                        results[command] = cached
+            missing = [command for command in batched if command not in results]
+            if missing:
+                outputs = split_outputs(self.post(device_ip, build_payload(cmd_type, missing)), missing)
+                if "error" in outputs:
+                    return outputs
+                for command, output in outputs.items():
+                    results[command] = self._remember(device_ip, command, output, cmd_type, generation)
+            for command in chunked:
+                if command not in results:
+                    output = self.read_chunked(device_ip, command)
+                    results[command] = self._remember(device_ip, command, output, cmd_type, generation)
+            return {command: results[command] for command in commands}
+
+        return fan_out(device_ips, run)
+
+    def iter_show(self, device_ip, command, cmd_type="cli_show_ascii"):
+        """
+        Yield the output of one show command piece by piece using NX-API chunk
+        mode. Only the current chunk is held in memory and the first one is
+        returned before the switch has sent the rest. No caller streams the
+        pieces yet, read_chunked joins them, so the answer's time to first
+        byte doesn't gain from this.
+        """
+        sid = "sid"
+        while True:
+            response = self.post(device_ip, build_payload(cmd_type, [command], chunk="1", sid=sid))
+            if "ins_api" not in response:
+                raise NxapiError(response)
+            output = response["ins_api"].get("outputs", {}).get("output", {})
+            if isinstance(output, list):
+                output = output[0] if output else {}
+            if str(output.get("code")) != "200":
+                raise NxapiError(output)
+            if output.get("body"):
+                yield output["body"]
+            sid = response["ins_api"].get("sid")
+            if not sid or sid == "eoc":
+                return
+
+    def read_chunked(self, device_ip, command, max_output=MAX_OUTPUT):
+        """Collect a chunked output, stopping once max_output characters were read."""
+        parts = []
+        size = 0
+        chunks = self.iter_show(device_ip, command)
+        try:
+            for chunk in chunks:
+                parts.append(chunk[:max_output - size])
+                size += len(parts[-1])
+                if size >= max_output:
+                    return {"code": "200", "msg": "Success", "body": "".join(parts), "truncated": True}
+        except NxapiError as e:
+            return e.args[0]
+        finally:
+            # a truncated output leaves its chunk session (sid) short of eoc, no more chunks are
+            # asked for and the switch drops the session when it times out
+            chunks.close()
+        return {"code": "200", "msg": "Success", "body": "".join(parts)}
+
+    def _generation(self, device_ip):
+        return self._generations.get(device_ip.lower(), 0)
+
+    def _next_generation(self, device_ip):
+        self._generations[device_ip.lower()] = self._generation(device_ip) + 1
+
+    def _remember(self, device_ip, command, output, cmd_type, generation):
+        # an output asked for before the device was configured may predate the change, the check
+        # and the store share the lock configure takes to move to the next generation
+        with self._generation_lock:
+            if self.cache is not None and str(output.get("code")) == "200" and generation == self._generation(device_ip):
+                self.cache.set(device_ip, command, output, cmd_type)
+        return output
+
+    def configure(self, device_ips, commands):
+        payload = build_payload("cli_conf", parse_commands(commands), rollback="rollback-on-error")
+
+        def run(device_ip):
+            # show calls started before or while the change is made belong to older generations
+            with self._generation_lock:
+                self._next_generation(device_ip)
+            try:
+                response = self.post(device_ip, payload)
+            finally:
+                with self._generation_lock:
+                    self._next_generation(device_ip)
+            # once the switch has processed the request its cached state can be stale
+            if self.cache is not None and "ins_api" in response:
+                self.cache.invalidate_device(device_ip)
+            return response
+
+        return fan_out(device_ips, run)
+
+    def close(self):
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the NxapiClient shared by every caller in the process."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = NxapiClient(
+                cache=ShowCache() if SHOW_CACHE_ENABLED else None,
+                inventory=get_inventory(),
+            )
+        return _client
@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import asyncio
+import contextlib
+
+import httpx
+
+from nxapi import (
+    CHUNKED_COMMANDS,
+    IDLE_TIMEOUT,
+    MAX_OUTPUT,
+    MAX_WORKERS,
+    NXAPI_COOKIE,
+    NXAPI_URL,
+    SHOW_CACHE_ENABLED,
+    TIMEOUT,
+    NxapiError,
+    build_payload,
+    parse_commands,
+    parse_device_ips,
+    split_outputs,
+)
+from show_cache import ShowCache, normalize_command
+from singleflight import ABANDONED, SINGLEFLIGHT_ENABLED, SingleFlight
+from admission import ADMISSION_ENABLED, FairLimiter
+from inventory import get_inventory
+from ai_fresh.metrics import METRICS_ENABLED, record, timed
+
+
+def connection_trace(device_ip):
+    """httpx trace hook recording TCP connect (including DNS) and TLS handshake times."""
+    started = {}
+    stages = {"connection.connect_tcp": "connect", "connection.start_tls": "tls"}
+
+    async def trace(event_name, info):
+        step, _, phase = event_name.rpartition(".")
+        if step not in stages:
+            return
+        if phase == "started":
+            started[step] = time.perf_counter()
+        elif phase == "complete" and step in started:
+            record(stages[step], time.perf_counter() - started.pop(step), device=device_ip)
+
+    return trace
+
+
+class AsyncNxapiClient:
+    """
+    asyncio counterpart of NxapiClient built on one httpx.AsyncClient, so
+    device calls never block the event loop. Connections are kept alive
+    and closed after idle_timeout seconds, the nxapi_auth cookie is reused
+    per device and at most max_workers devices are queried at once. With a
+    SingleFlight, concurrent requests for the same show output on the same
+    device share one NX-API call. With a FairLimiter, requests wait for a
+    free per-device and global slot, queued fairly across user sessions.
+    Configuring a device starts a new generation of it: show calls started
+    before are neither joined nor cached anymore.
+    """
+
+    def __init__(self, username=None, password=None, idle_timeout=IDLE_TIMEOUT,
+                 timeout=TIMEOUT, verify=False, cache=None, max_workers=MAX_WORKERS,
+                 inventory=None, inflight=None, limiter=None):
+        self.auth = (
+            username or os.getenv("CISCO_USER"),
+            password or os.getenv("CISCO_PASSWD"),
+        )
+        self.cache = cache
+        self.inflight = inflight
+        self.limiter = limiter
+        self.inventory = inventory
+        self.max_workers = max_workers
+        self._authenticated = set()
+        self._generations = {}
+        self._client = httpx.AsyncClient(
+            verify=verify,
+            timeout=timeout,
+            headers={"content-type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=max_workers,
+                max_keepalive_connections=max_workers,
+                keepalive_expiry=idle_timeout,
+            ),
+        )
+
+    async def post(self, device_ip, payload):
+        host = self.inventory.address(device_ip) if self.inventory else device_ip
+        url = NXAPI_URL.format(host=host)
+        data = json.dumps(payload)
+
+        # basic auth is only sent until the switch hands out its session cookie
+        auth = None if device_ip in self._authenticated else self.auth
+        extensions = {"trace": connection_trace(device_ip)} if METRICS_ENABLED else None
+        async with self._admit(device_ip):
+            with timed("nxapi", device=device_ip):
+                response = await self._client.post(url, content=data, auth=auth, extensions=extensions)
+                if response.status_code == 401 and auth is None:
+                    self._authenticated.discard(device_ip)
+                    response = await self._client.post(url, content=data, auth=self.auth, extensions=extensions)
+        if NXAPI_COOKIE in response.cookies:
+            self._authenticated.add(device_ip)
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {
+                "error": "Failed to execute command",
+                "status_code": response.status_code,
+                "details": response.text,
+            }
+
+    def _admit(self, device_ip):
+        return self.limiter.slot(device_ip) if self.limiter is not None else contextlib.nullcontext()
+
+    async def fan_out(self, device_ips, func, on_result=None):
+        """
+        Run func(device) for all devices, at most max_workers at a time.
+        on_result(device, result) is called as soon as each device is done.
+        """
+        devices = parse_device_ips(device_ips)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(device):
+            async with semaphore:
+                try:
+                    result = await func(device)
+                except Exception as e:
+                    result = {"error": "Failed to execute command", "details": str(e)}
+            if on_result is not None:
+                on_result(device, result)
+            return result
+
+        results = await asyncio.gather(*(run(device) for device in devices))
+        return dict(zip(devices, results))
+
+    async def show(self, device_ips, commands, cmd_type="cli_show_ascii", on_result=None, use_cache=True):
+        commands = parse_commands(commands)
+
+        async def run(device_ip, commands=commands):
+            chunked = [command for command in commands if command.startswith(CHUNKED_COMMANDS)]
+            batched = [command for command in commands if command not in chunked]
+            generation = self._generation(device_ip)
+            results = {}
+            if self.cache is not None and use_cache:
+                for command in commands:
+                    cached = self.cache.get(device_ip, command, cmd_type)
+                    if cached is not None:
+                        results[command] = cached
+            missing = [command for command in batched if command not in results]
+            # commands another request is already running on this device are awaited, not sent again
+            waiting = {}
+            if self.inflight is not None:
+                for command in missing:
+                    future = self.inflight.join(self._inflight_key(device_ip, command, cmd_type, generation))
+                    if future is not None:
+                        waiting[command] = future
+                missing = [command for command in missing if command not in waiting]
+                for command in missing:
+                    self.inflight.lead(self._inflight_key(device_ip, command, cmd_type, generation))
+            if missing:
+                try:
+                    outputs = split_outputs(await self.post(device_ip, build_payload(cmd_type, missing)), missing)
+                except asyncio.CancelledError:
+                    self._finish(device_ip, missing, cmd_type, generation, abandoned=True)
+                    raise
+                except BaseException as e:
+                    self._finish(device_ip, missing, cmd_type, generation, error=NxapiError(str(e) or "Request failed"))
+                    raise
+                if "error" in outputs:
+                    self._finish(device_ip, missing, cmd_type, generation, outputs)
+                    return outputs
+                for command, output in outputs.items():
+                    results[command] = self._remember(device_ip, command, output, cmd_type, generation)
+                self._finish(device_ip, missing, cmd_type, generation, results)
+            retry = []
+            for command, future in waiting.items():
+                output = await self.inflight.wait(future)
+                if output is ABANDONED:
+                    retry.append(command)
+                    continue
+                if "error" in output:
+                    return output
+                results[command] = output
+            if retry:
+                # the request we waited for was cancelled, which says nothing about the device
+                outputs = await run(device_ip, retry)
+                if "error" in outputs:
+                    return outputs
+                results.update(outputs)
+            for command in chunked:
+                if command not in results:
+                    results[command] = await self._read_chunked_once(device_ip, command, cmd_type, generation)
+            return {command: results[command] for command in commands}
+
+        return await self.fan_out(device_ips, run, on_result)
+
+    async def iter_show(self, device_ip, command, cmd_type="cli_show_ascii"):
+        """Async NxapiClient.iter_show; read_chunked joins the pieces, none are streamed to the answer yet."""
+        sid = "sid"
+        while True:
+            response = await self.post(device_ip, build_payload(cmd_type, [command], chunk="1", sid=sid))
+            if "ins_api" not in response:
+                raise NxapiError(response)
+            output = response["ins_api"].get("outputs", {}).get("output", {})
+            if isinstance(output, list):
+                output = output[0] if output else {}
+            if str(output.get("code")) != "200":
+                raise NxapiError(output)
+            if output.get("body"):
+                yield output["body"]
+            sid = response["ins_api"].get("sid")
+            if not sid or sid == "eoc":
+                return
+
+    async def read_chunked(self, device_ip, command, max_output=MAX_OUTPUT):
+        """Collect a chunked output, stopping once max_output characters were read."""
+        parts = []
+        size = 0
+        chunks = self.iter_show(device_ip, command)
+        try:
+            async for chunk in chunks:
+                parts.append(chunk[:max_output - size])
+                size += len(parts[-1])
+                if size >= max_output:
+                    return {"code": "200", "msg": "Success", "body": "".join(parts), "truncated": True}
+        except NxapiError as e:
+            return e.args[0]
+        finally:
+            # an abandoned async generator would only be closed by the garbage collector
+            await chunks.aclose()
+        return {"code": "200", "msg": "Success", "body": "".join(parts)}
+
+    def _generation(self, device_ip):
+        return self._generations.get(device_ip.lower(), 0)
+
+    def _next_generation(self, device_ip):
+        self._generations[device_ip.lower()] = self._generation(device_ip) + 1
+
+    def _inflight_key(self, device_ip, command, cmd_type, generation):
+        return device_ip.lower(), generation, cmd_type, normalize_command(command)
+
+    def _finish(self, device_ip, commands, cmd_type, generation, outputs=None, error=None, abandoned=False):
+        """
+        Hand the leader's outputs (or a device error) to requests waiting for
+        the same commands; abandoned (the leader was cancelled) makes them retry.
+        """
+        if self.inflight is None:
+            return
+        for command in commands:
+            if abandoned:
+                self.inflight.abandon(self._inflight_key(device_ip, command, cmd_type, generation))
+                continue
+            result = outputs if outputs is None or "error" in outputs else outputs[command]
+            self.inflight.finish(self._inflight_key(device_ip, command, cmd_type, generation), result, error)
+
+    async def _read_chunked_once(self, device_ip, command, cmd_type, generation):
+        async def read():
+            output = await self.read_chunked(device_ip, command)
+            return self._remember(device_ip, command, output, cmd_type, generation)
+
+        if self.inflight is None:
+            return await read()
+        return await self.inflight.do(self._inflight_key(device_ip, command, "chunked", generation), read)
+
+    def _remember(self, device_ip, command, output, cmd_type, generation):
+        # an output asked for before the device was configured may predate the change
+        if self.cache is not None and str(output.get("code")) == "200" and generation == self._generation(device_ip):
+            self.cache.set(device_ip, command, output, cmd_type)
+        return output
+
+    async def configure(self, device_ips, commands, on_result=None):
+        payload = build_payload("cli_conf", parse_commands(commands), rollback="rollback-on-error")
+
+        async def run(device_ip):
+            # show calls started before or while the change is made belong to older generations
+            self._next_generation(device_ip)
+            try:
+                response = await self.post(device_ip, payload)
+            finally:
+                self._next_generation(device_ip)
+            if self.cache is not None and "ins_api" in response:
+                self.cache.invalidate_device(device_ip)
+            return response
+
+        return await self.fan_out(device_ips, run, on_result)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def create_async_client():
+    return AsyncNxapiClient(
+        cache=ShowCache() if SHOW_CACHE_ENABLED else None,
+        inventory=get_inventory(),
+        inflight=SingleFlight() if SINGLEFLIGHT_ENABLED else None,
+        limiter=FairLimiter() if ADMISSION_ENABLED else None,
+    )
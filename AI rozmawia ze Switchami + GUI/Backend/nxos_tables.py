@@ -0,0 +1,224 @@
+import os
+import re
+import json
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_ROWS = int(os.getenv("STRUCTURED_MAX_ROWS", "50"))
+
+# columns worth keeping even when the question does not name them
+KEY_COLUMNS = ("name", "id", "state", "status", "desc", "mode", "type")
+
+
+def parse_tables(body):
+    """
+    Flatten NX-OS cli_show JSON (TABLE_x / ROW_x nesting) into typed tables:
+    {"fields": {scalar fields}, "tables": {"x": [row, ...]}}
+    """
+    fields = {}
+    tables = {}
+    _collect(body, fields, tables)
+    return {"fields": fields, "tables": tables}
+
+
+def _collect(node, fields, tables):
+    for key, value in node.items():
+        if key.startswith("TABLE_"):
+            name = key[len("TABLE_"):]
+            rows = value.get(f"ROW_{name}", []) if isinstance(value, dict) else value
+            if isinstance(rows, dict):
+                rows = [rows]
+            for row in rows:
+                flat = {}
+                _collect(row, flat, tables)
+                tables.setdefault(name, []).append(flat)
+        elif isinstance(value, dict):
+            _collect(value, fields, tables)
+        else:
+            fields[key] = value
+
+
+def key_column(rows):
+    """Column identifying a row: the interface, an id or a name column, else the first one."""
+    columns = list(rows[0]) if rows else []
+    for column in columns:
+        lower = column.lower()
+        if "interface" in lower or lower.endswith(("id", "name")):
+            return column
+    return columns[0] if columns else None
+
+
+def question_words(question, exclude=()):
+    """Identifiers (words with a digit) and names (other words of 3+ characters) of a question, minus exclude."""
+    exclude = {word.lower() for word in exclude}
+    words = {word.strip(".:-") for word in re.findall(r"[a-z0-9/.:_-]+", question.lower())}
+    words -= exclude | {""}
+    identifiers = {word for word in words if any(ch.isdigit() for ch in word)}
+    names = {word for word in words if len(word) > 2 and word not in identifiers}
+    return identifiers, names
+
+
+def matches(row, identifiers):
+    return bool(identifiers & {str(value).lower() for value in row.values()})
+
+
+def table_view(rows, identifiers, names):
+    """
+    Rows and columns of a table that relate to the question, as (rows,
+    columns, filtered). All rows are kept when the identifiers match none,
+    an empty columns set means every column.
+    """
+    filtered = False
+    if identifiers:
+        matched = [row for row in rows if matches(row, identifiers)]
+        # nothing matched, the identifiers were not about this table
+        if matched:
+            rows = matched
+            filtered = True
+    key = key_column(rows)
+    columns = {
+        column for row in rows for column in row
+        if column == key or any(word in column.lower() for word in names | set(KEY_COLUMNS))
+    }
+    return rows, columns, filtered
+
+
+def project(parsed, question, max_rows=MAX_ROWS, exclude=()):
+    """
+    Keep only the rows and columns of parsed tables that relate to the
+    question. Rows are filtered by identifiers from the question (vlan ids,
+    interface names, addresses), columns by words from the question. Words
+    in exclude (the target devices' names and addresses) are not used, all
+    rows are kept when the filter matches none and the key column is
+    always kept.
+    """
+    identifiers, names = question_words(question, exclude)
+    tables = {}
+    for name, rows in parsed["tables"].items():
+        table = {"rows_total": len(rows)}
+        rows, columns, filtered = table_view(rows, identifiers, names)
+        if filtered:
+            table["filter"] = sorted(identifiers)
+        if columns:
+            rows = [{k: v for k, v in row.items() if k in columns} for row in rows]
+        table["rows"] = rows[:max_rows]
+        tables[name] = table
+
+    result = {"tables": tables}
+    if parsed["fields"]:
+        result["fields"] = parsed["fields"]
+    return result
+
+
+def project_diff(diff, parsed, question, exclude=()):
+    """
+    Reduce a ChangeTracker difference of a cli_show output to the rows and
+    columns project keeps of the current output, so changes in columns the
+    question is not about (counters, mostly) are left out. None when
+    nothing of the projected view changed.
+    """
+    identifiers, names = question_words(question, exclude)
+    tables = {}
+    for name, table in diff.get("tables", {}).items():
+        rows, columns, filtered = table_view(parsed["tables"].get(name, []), identifiers, names)
+
+        def keep(row):
+            return {k: v for k, v in row.items() if k in columns} if columns else row
+
+        projected = {}
+        for kind in ("added", "removed"):
+            kept = [keep(row) for row in table.get(kind, []) if not filtered or matches(row, identifiers)]
+            if kept:
+                projected[kind] = kept
+        changed = []
+        for entry in table.get("changed", []):
+            column, value = next((k, v) for k, v in entry.items() if k not in ("before", "after"))
+            if filtered and not any(str(row.get(column)) == str(value) for row in rows):
+                continue
+            before, after = keep(entry["before"]), keep(entry["after"])
+            if before or after:
+                changed.append({column: value, "before": before, "after": after})
+        if changed:
+            projected["changed"] = changed
+        if projected:
+            tables[name] = projected
+
+    projected = {}
+    if diff.get("fields"):
+        projected["fields"] = diff["fields"]
+    if tables:
+        projected["tables"] = tables
+    return projected or None
+
+
+def size(value):
+    return len(json.dumps(value, default=str))
+
+
+def compact_result(result, question, changes=None, exclude=()):
+    """
+    Reduce a get_info_from_devices / configure_devices result to what the
+    follow-up model call needs: status codes plus projected tables or text.
+    With changes from ChangeTracker.track, outputs carry their version and
+    their difference to the previous one, projected like the tables
+    (project_diff) and only when it is smaller than the output. An output
+    whose previous version is already in the request's messages is replaced
+    by that difference, unless the tables were filtered for the question
+    (the rows asked about may not be in the difference). "unchanged" means
+    nothing changed in the projected rows and columns.
+    exclude are words of the question not to filter on, see project.
+    """
+    changes = changes or {}
+    compact = {}
+    for device, outputs in result.items():
+        # errors, pre-check and rollout report entries are already compact
+        if not isinstance(outputs, dict) or "error" in outputs or "status" in outputs:
+            compact[device] = outputs
+            continue
+
+        if "ins_api" in outputs:
+            output = outputs["ins_api"].get("outputs", {}).get("output", [])
+            if isinstance(output, dict):
+                output = [output]
+            compact[device] = [
+                {key: item[key] for key in ("code", "msg", "body") if item.get(key)}
+                for item in output
+            ]
+            continue
+
+        compact[device] = {}
+        for command, output in outputs.items():
+            entry = {"code": output.get("code")}
+            if str(output.get("code")) != "200":
+                entry["msg"] = output.get("msg")
+            body = output.get("body")
+            parsed = parse_tables(body) if isinstance(body, dict) else None
+            if parsed is not None:
+                entry.update(project(parsed, question, exclude=exclude))
+            elif body:
+                entry["output"] = body
+            if output.get("truncated"):
+                entry["truncated"] = True
+            if output.get("snapshot_age") is not None:
+                entry["snapshot_age"] = output["snapshot_age"]
+            change = changes.get(device, {}).get(command)
+            if change is not None:
+                diff = change["diff"]
+                if diff is not None and parsed is not None:
+                    diff = project_diff(diff, parsed, question, exclude)
+                # a difference is only worth sending when it is smaller than the output it stands for
+                smaller = diff is None or size(diff) < size(entry)
+                filtered = any("filter" in table for table in entry.get("tables", {}).values())
+                if change["seen"] and not filtered and smaller:
+                    entry = {key: value for key, value in entry.items() if key in ("code", "snapshot_age")}
+                entry["version"] = change["version"]
+                if change["previous"] is not None:
+                    entry["baseline_age"] = change["baseline_age"]
+                    if diff is None:
+                        entry["unchanged"] = True
+                    elif smaller:
+                        entry["diff"] = diff
+            compact[device][command] = entry
+    return compact
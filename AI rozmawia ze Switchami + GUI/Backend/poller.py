@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import asyncio
+import threading
+
+from dotenv import load_dotenv
+
+from nxapi import parse_commands
+from show_cache import normalize_command
+from admission import session_id
+
+load_dotenv()
+
+POLLER_ENABLED = os.getenv("POLLER_ENABLED", "0") == "1"
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "60"))
+POLL_COMMANDS = os.getenv("POLL_COMMANDS", "show vlan brief;show interface status")
+POLL_TARGETS = os.getenv("POLL_TARGETS", "all")
+POLL_CONCURRENCY = int(os.getenv("POLL_CONCURRENCY", "8"))
+SNAPSHOT_DB = os.getenv("SNAPSHOT_DB", ":memory:")
+SNAPSHOT_VERSIONS = int(os.getenv("SNAPSHOT_VERSIONS", "5"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "60"))
+
+
+class SnapshotStore:
+    """
+    Versioned show outputs per device and command in SQLite, stored as
+    zlib-compressed JSON. Only the last `versions` snapshots are kept.
+    invalidate() drops a device's snapshots once it is configured, and
+    outputs taken before that are not stored anymore. Every method does
+    SQLite I/O, async code calls them with asyncio.to_thread.
+    """
+
+    def __init__(self, path=SNAPSHOT_DB, versions=SNAPSHOT_VERSIONS):
+        self.versions = versions
+        self._invalidated = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "device TEXT, command TEXT, version INTEGER, taken REAL, data BLOB, "
+            "PRIMARY KEY (device, command, version))"
+        )
+        self._db.commit()
+
+    def put(self, device, command, output, taken=None):
+        device = device.lower()
+        command = normalize_command(command)
+        taken = time.time() if taken is None else taken
+        data = zlib.compress(json.dumps(output).encode("utf-8"))
+        with self._lock:
+            if taken < self._invalidated.get(device, 0):
+                return None
+            row = self._db.execute(
+                "SELECT MAX(version) FROM snapshots WHERE device = ? AND command = ?", (device, command)
+            ).fetchone()
+            version = (row[0] or 0) + 1
+            self._db.execute(
+                "INSERT INTO snapshots (device, command, version, taken, data) VALUES (?, ?, ?, ?, ?)",
+                (device, command, version, taken, data),
+            )
+            self._db.execute(
+                "DELETE FROM snapshots WHERE device = ? AND command = ? AND version <= ?",
+                (device, command, version - self.versions),
+            )
+            self._db.commit()
+        return version
+
+    def invalidate(self, *devices):
+        with self._lock:
+            for device in devices:
+                device = device.lower()
+                self._invalidated[device] = time.time()
+                self._db.execute("DELETE FROM snapshots WHERE device = ?", (device,))
+            self._db.commit()
+
+    def latest(self, device, command, max_age=None):
+        """Newest snapshot as (version, taken, output), or None if missing or older than max_age."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, taken, data FROM snapshots WHERE device = ? AND command = ? "
+                "ORDER BY version DESC LIMIT 1",
+                (device.lower(), normalize_command(command)),
+            ).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return row[0], row[1], json.loads(zlib.decompress(row[2]))
+
+    def lookup(self, devices, commands, max_age):
+        """
+        Outputs of devices that have a fresh enough snapshot of every command,
+        in the same shape as a live get_info_from_devices result.
+        """
+        results = {}
+        now = time.time()
+        for device in devices:
+            outputs = {}
+            for command in commands:
+                snapshot = self.latest(device, command, max_age)
+                if snapshot is None:
+                    break
+                _, taken, output = snapshot
+                outputs[command] = dict(output, snapshot_age=round(now - taken, 1))
+            else:
+                results[device] = outputs
+        return results
+
+
+class Poller:
+    """
+    Background task polling POLL_COMMANDS on the POLL_TARGETS devices every
+    interval seconds through the assistant, at most `concurrency` devices at
+    a time, and saving successful outputs to the snapshot store.
+    """
+
+    def __init__(self, assistant, store, commands=POLL_COMMANDS, targets=POLL_TARGETS,
+                 interval=POLL_INTERVAL, concurrency=POLL_CONCURRENCY):
+        self.assistant = assistant
+        self.store = store
+        self.commands = parse_commands(commands)
+        self.targets = targets
+        self.interval = interval
+        self.concurrency = concurrency
+        self.polls = 0
+        self.errors = 0
+        self._task = None
+
+    async def poll_once(self):
+        try:
+            devices = self.assistant.targets(self.targets)
+        except ValueError:
+            return
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def poll(device):
+            async with semaphore:
+                # the age of a snapshot counts from before the request, outputs are never older
+                taken = time.time()
+                result = await self.assistant.get_info_from_devices(
+                    device_ips=[device], show_cmd=self.commands, max_age=0
+                )
+            outputs = result.get(device, {})
+            if "error" in outputs:
+                self.errors += 1
+                return
+            for command, output in outputs.items():
+                if str(output.get("code")) == "200":
+                    await asyncio.to_thread(self.store.put, device, command, output, taken)
+
+        await asyncio.gather(*(poll(device) for device in devices))
+        self.polls += 1
+
+    async def run(self):
+        # polling queues for NX-API slots like one more user session
+        session_id.set("poller")
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                self.errors += 1
+                print("poller error: ", e)
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,208 @@
+import os
+import re
+import asyncio
+
+from dotenv import load_dotenv
+
+from nxapi import parse_commands
+from rollout import device_status
+
+load_dotenv()
+
+CONFIG_PRECHECK = os.getenv("CONFIG_PRECHECK", "1") == "1"
+# always read from the device, a cached copy could miss a change made since and skip needed commands
+PRECHECK_COMMAND = "show running-config"
+
+# top-level commands opening a configuration mode, whether or not the switch has them yet
+CONTEXT_KEYWORDS = (
+    "interface ", "vlan ", "router ", "vrf context ", "ip access-list ", "ipv6 access-list ",
+    "route-map ", "policy-map ", "class-map ", "line ", "vpc domain ", "role name ",
+    "spanning-tree mst configuration", "port-profile ", "object-group ",
+)
+
+INTERFACE_NAMES = (
+    (re.compile(r"^(e|eth|ethernet)\s*(?=\d)", re.I), "ethernet"),
+    (re.compile(r"^(po|port-channel)\s*(?=\d)", re.I), "port-channel"),
+    (re.compile(r"^(lo|loopback)\s*(?=\d)", re.I), "loopback"),
+    (re.compile(r"^(mgmt)\s*(?=\d)", re.I), "mgmt"),
+    (re.compile(r"^(vlan)\s*(?=\d)", re.I), "vlan"),
+)
+
+
+def normalize_line(line):
+    line = " ".join(line.split())
+    if line.lower().startswith("interface "):
+        name = line[len("interface "):]
+        for pattern, full in INTERFACE_NAMES:
+            name = pattern.sub(full, name)
+        line = "interface " + name.lower()
+    return line
+
+
+def vlan_ids(value):
+    """Ids of a vlan list like 1,10-12, or an empty set if it is not one."""
+    ids = set()
+    for part in value.split(","):
+        bounds = part.split("-")
+        if not all(bound.isdigit() for bound in bounds) or len(bounds) > 2:
+            return set()
+        ids.update(range(int(bounds[0]), int(bounds[-1]) + 1))
+    return ids
+
+
+class RunningConfig:
+    """
+    Running configuration parsed into the paths of its lines, e.g.
+    ("interface ethernet1/1", "description uplink"), with the vlans created
+    by list lines (vlan 1,10-12) kept separately.
+    """
+
+    def __init__(self, text):
+        self.paths = set()
+        self.parents = set()
+        self.vlans = set()
+        stack = []
+        for raw in text.splitlines():
+            if not raw.strip() or raw.lstrip().startswith("!"):
+                continue
+            indent = len(raw) - len(raw.lstrip())
+            while stack and stack[-1][0] >= indent:
+                stack.pop()
+            path = tuple(line for _, line in stack) + (normalize_line(raw),)
+            self.paths.add(path)
+            if stack:
+                self.parents.add(path[:-1])
+            if len(path) == 1 and path[0].startswith("vlan "):
+                self.vlans |= vlan_ids(path[0][len("vlan "):])
+            stack.append((indent, path[-1]))
+
+    def has(self, path):
+        if path in self.paths:
+            return True
+        # vlans without other settings only show up in the vlan list line
+        return len(path) == 1 and path[0].startswith("vlan ") and path[0][len("vlan "):].isdigit() \
+            and int(path[0][len("vlan "):]) in self.vlans
+
+    def is_parent(self, path):
+        return path in self.parents
+
+
+def plan(running_config, commands):
+    """
+    Split configuration commands into the ones missing from the running
+    config and the ones already in it. Returns (push, missing, present):
+    push are the commands to send, the missing ones with the mode commands
+    (interface, vlan, ...) needed to reach them. Checks are conservative,
+    a command that can't be placed for sure counts as missing.
+    """
+    config = RunningConfig(running_config)
+    push, missing, present = [], [], []
+    # configuration mode of the commands as given and the mode reached by the pushed ones
+    path = sent = ()
+    headers = {}
+    # once a command inside a mode is missing, later ones may belong to a new sub-mode
+    dirty = False
+
+    for command in parse_commands(commands):
+        line = normalize_line(command)
+        if line in ("exit", "end"):
+            if sent == path and path:
+                push.append(command)
+                sent = sent[:-1] if line == "exit" else ()
+            path = path[:-1] if line == "exit" else ()
+            dirty = dirty and bool(path)
+            continue
+
+        if path and not dirty and config.has(path + (line,)):
+            level = path
+        elif not path or line.startswith(CONTEXT_KEYWORDS) or config.has((line,)):
+            level = ()
+            dirty = False
+        else:
+            level = path
+        opens = config.is_parent(level + (line,)) or (not level and line.startswith(CONTEXT_KEYWORDS))
+
+        if not dirty and config.has(level + (line,)):
+            present.append(command)
+        else:
+            missing.append(command)
+            if sent != level:
+                push.extend(headers[level[:i + 1]] for i in range(len(level)))
+            push.append(command)
+            sent = level + (line,) if opens else level
+            dirty = bool(level) or opens
+
+        if opens:
+            path = level + (line,)
+            headers[path] = command
+        else:
+            path = level
+    return push, missing, present
+
+
+def running_config(output):
+    """Text of a show running-config output, or None if it can't be used for a pre-check."""
+    if not isinstance(output, dict) or str(output.get("code")) != "200" or output.get("truncated"):
+        return None
+    body = output.get("body")
+    return body if isinstance(body, str) else None
+
+
+def unchanged_entry(present):
+    return {"status": "unchanged", "code": None, "msg": "Already configured", "applied": [], "skipped": present}
+
+
+def applied_entry(response, missing, present):
+    return dict(device_status(response), applied=missing, skipped=present)
+
+
+def group_plans(outputs, devices, commands):
+    """
+    Pre-check every device against its running config output. Returns the
+    entries of devices needing no change and the devices to configure
+    grouped by the commands to push, {push: (devices, missing, present)}.
+    Devices without a usable running config get every command.
+    """
+    commands = parse_commands(commands)
+    unchanged = {}
+    groups = {}
+    for device in devices:
+        text = running_config(outputs.get(device, {}).get(PRECHECK_COMMAND))
+        if text is None:
+            push, missing, present = commands, commands, []
+        else:
+            push, missing, present = plan(text, commands)
+        if not push:
+            unchanged[device] = unchanged_entry(present)
+            continue
+        groups.setdefault(tuple(push), ([], missing, present))[0].append(device)
+    return unchanged, groups
+
+
+async def configure_missing(nxapi, devices, commands, on_result=None):
+    """
+    Configure devices with only the commands their running config lacks,
+    one cli_conf request per group of devices needing the same commands.
+    Returns {device: {"status", "code", "msg", "applied", "skipped"}} with
+    status "unchanged" for devices that were not configured at all.
+    """
+    outputs = await nxapi.show(devices, [PRECHECK_COMMAND], use_cache=False)
+    unchanged, groups = group_plans(outputs, devices, commands)
+    for device, entry in unchanged.items():
+        if on_result is not None:
+            on_result(device, entry)
+
+    async def configure(push, group):
+        targets, missing, present = group
+
+        def report(device, response):
+            if on_result is not None:
+                on_result(device, applied_entry(response, missing, present))
+
+        responses = await nxapi.configure(targets, list(push), report)
+        return {device: applied_entry(response, missing, present) for device, response in responses.items()}
+
+    results = dict(unchanged)
+    for entries in await asyncio.gather(*(configure(push, group) for push, group in groups.items())):
+        results.update(entries)
+    return {device: results[device] for device in devices}
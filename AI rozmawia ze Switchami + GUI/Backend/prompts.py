@@ -0,0 +1,246 @@
+import os
+import json
+
+from dotenv import load_dotenv
+
+from history import count_tokens
+
+load_dotenv()
+
+PROMPT_MODEL = os.getenv("PROMPT_MODEL", "gpt-3.5-turbo-16k")
+# tokens a request may have, the 16k context minus room for the answer
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "14000"))
+# tool results are cut down to this many tokens before the chat history is trimmed
+PROMPT_MIN_TOOL_TOKENS = int(os.getenv("PROMPT_MIN_TOOL_TOKENS", "2000"))
+# tokens OpenAI adds around every message
+MESSAGE_OVERHEAD = 4
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_info_from_devices",
+            "description": """
+            Get information from Cisco switches 
+            based on show commands
+            """,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "device_ips": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": """
+                            List of device IP addresses or switch name. 
+                            If there is more than 1 IP Address or 
+                            switchname provided, then it should be 
+                            provided in the same string and separated 
+                            with ; character. Groups of switches from 
+                            the inventory can be selected with 
+                            group:<name>, tag:<name>, both joined with & 
+                            (e.g. group:leaf&tag:dc2) or all.
+                            """,
+                    },
+                    "show_cmd": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": """
+                            List of show commands to be executed on the 
+                            devices. Each should be a valid Cisco NX-OS 
+                            show command. If more than 1 command is 
+                            needed to answer, provide all of them at once, 
+                            they are sent to the device in one request.
+                            """,
+                    },
+                    "max_age": {
+                        "type": "integer",
+                        "description": """
+                            Optional. Maximum age in seconds of a recently 
+                            polled output that may be used instead of 
+                            asking the device. Use 0 when the user needs 
+                            the live state, e.g. right after a change.
+                            """,
+                    },
+                },
+                "required": ["device_ips", "show_cmd"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "configure_devices",
+            "description": """
+            configure devices
+            """,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "device_ips": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": """
+                            List of device IP addresses or switch name. 
+                            If there is more than 1 IP Address or 
+                            switchname provided, then it should be 
+                            provided in the same string and separated 
+                            with ; character. Groups of switches from 
+                            the inventory can be selected with 
+                            group:<name>, tag:<name>, both joined with & 
+                            (e.g. group:leaf&tag:dc2) or all.
+                            """,
+                    },
+                    "configuration_cmd": {
+                        "type": "array",
+                        "items": {"type:": "string"},
+                        "description": """
+                            Configuration command to be executed on the 
+                            devices. This should be a valid Cisco NX-OS 
+                            show command.
+                            """,
+                    },
+                },
+                "required": ["device_ips", "configuration_cmd"],
+            },
+        },
+    },
+]
+
+# Everything up to the chat history is the same on every call, so providers
+# can reuse it as a cached prefix. Nothing per request may go in here.
+INSTRUCTIONS = """\
+I’m an AI assistant for network engineers, designed to make your job easier by interacting directly with network devices through specific function calls. Here’s how I operate:
+
+Function Specificity: Use each function exactly for its intended purpose. For example, use get_info_from_devices to retrieve status and information with "show" commands. This function is not for configuring or changing device settings.
+
+Information Completeness: Don't guess if you don’t have enough info to execute a function. If you need a switch name or IP address and it’s missing, ask for it: "Please provide the switch name or IP address to proceed." Use the switch name as the primary identifier if it's provided.
+
+Action Restrictions: If there's no dedicated function for a requested action, or if it's beyond my capabilities (like configuring a device), explain the limitation politely: "I'm sorry, but configuring devices directly is beyond my current capabilities. My functions are limited to executing 'show' commands to gather information."
+
+Guidance and Clarity: Be clear about what functions I can perform and what information I need. If a request is incomplete, provide a brief description of the missing details. For example, if asked to log in or check a switch, I'll interpret it as a status query or device check request.
+
+Adherence to Scope: Stick to what I’m designed to do. Don’t perform functions or provide assistance beyond my scope, no matter the request.
+
+Additionally, I can log into switches and perform checks or verifications. If you need me to check or verify something, I'll find and execute the right function. When using show commands, I’ll automatically know and use the correct command without asking you which one.
+
+My goal is to help network engineers be more efficient while ensuring safety, accuracy, and adherence to procedures. If unsure, I’ll seek clarity or more information rather than guessing. If a command isn't specified, I'll suggest one and use it. If I need to comment, I'll keep it brief unless you ask for more detail.
+
+I SHOULD ALWAYS CONSIDER CHAT HISTORY, it is given in the next system message.
+
+FUNCTION CALLING RULES:'''
+If user requests to check someting on the switches it means you should use get_info_from_devices
+If user request to configure somwthing on the switches it means you should use configure_devices
+If more than one function call is needed, I request all of them at once, they are executed in parallel
+'''
+
+FUNCTION RESULTS:'''
+Function results are keyed by device and include a response code for every command,
+for 'cli_conf' configurations and 'cli_show' show commands. I interpret these statuses
+and give a clear, human-like answer based on the question and the output status.
+'''
+"""
+
+HISTORY_HEADER = "CHAT HISTORY:"
+
+TOOLS_TOKENS = count_tokens(json.dumps(TOOLS))
+INSTRUCTIONS_TOKENS = count_tokens(INSTRUCTIONS) + MESSAGE_OVERHEAD
+
+
+class PromptTooLarge(ValueError):
+    pass
+
+
+class PromptBuilder:
+    """
+    Builds the chat.completions requests of the assistant as the static
+    prefix (TOOLS, then INSTRUCTIONS as the first system message), the chat
+    history as a second system message and the user's question, followed by
+    tool calls and results as they come. fit() counts the tokens of every
+    section before a call and keeps the request under max_tokens.
+    """
+
+    def __init__(self, model=PROMPT_MODEL, max_tokens=PROMPT_MAX_TOKENS, min_tool_tokens=PROMPT_MIN_TOOL_TOKENS):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.min_tool_tokens = min_tool_tokens
+        self.last_stats = {}
+
+    def build(self, user_input, chat_history):
+        messages = [{"role": "system", "content": INSTRUCTIONS}]
+        if chat_history:
+            messages.append({"role": "system", "content": f"{HISTORY_HEADER}\n{chat_history}"})
+        messages.append({"role": "user", "content": user_input})
+        return {"model": self.model, "tools": TOOLS, "messages": messages}
+
+    def count(self, query):
+        """Tokens of the request by section."""
+        sections = {
+            "tools": TOOLS_TOKENS if query.get("tools") == TOOLS else count_tokens(json.dumps(query.get("tools", []))),
+            "instructions": 0,
+            "history": 0,
+            "user": 0,
+            "assistant": 0,
+            "tool_results": 0,
+        }
+        for message in query["messages"]:
+            if message["content"] == INSTRUCTIONS:
+                sections["instructions"] += INSTRUCTIONS_TOKENS
+                continue
+            tokens = count_tokens(message["content"] or "") + MESSAGE_OVERHEAD
+            if message["role"] == "assistant" and message.get("tool_calls"):
+                tokens += count_tokens(json.dumps(message["tool_calls"]))
+            section = {"system": "history", "tool": "tool_results"}.get(message["role"], message["role"])
+            sections[section] += tokens
+        sections["total"] = sum(sections.values())
+        return sections
+
+    def fit(self, query):
+        """
+        Count the request and, when it is over max_tokens, shorten the
+        largest tool results down to min_tool_tokens, then drop the oldest
+        lines of the chat history and last cut the tool results further.
+        Raises PromptTooLarge when the rest alone is over the limit. Returns
+        the token counts by section.
+        """
+        stats = self.count(query)
+        stats = self._shorten_tool_results(query, stats, self.min_tool_tokens)
+        while stats["total"] > self.max_tokens and stats["history"]:
+            self._trim_history(query)
+            stats = self.count(query)
+        stats = self._shorten_tool_results(query, stats, 16)
+        if stats["total"] > self.max_tokens:
+            raise PromptTooLarge(f"Request has {stats['total']} tokens, the limit is {self.max_tokens}: {stats}")
+        self.last_stats = stats
+        return stats
+
+    def _shorten_tool_results(self, query, stats, floor):
+        """Cut the largest tool results, none below floor tokens, until the request fits."""
+        over = stats["total"] - self.max_tokens
+        while over > 0:
+            # results already cut to about floor are left alone, cutting them again would only loop
+            sizes = [
+                (count_tokens(message["content"]), i) for i, message in enumerate(query["messages"])
+                if message["role"] == "tool"
+            ]
+            tokens, i = max(sizes, default=(0, None))
+            if tokens <= floor + 16:
+                break
+            largest = query["messages"][i]
+            # tool results are JSON, a cut one is marked so the model knows it is incomplete
+            keep = max(floor, tokens - over - 8) * len(largest["content"]) // tokens
+            largest["content"] = largest["content"][:keep] + " [...]"
+            stats = self.count(query)
+            over = stats["total"] - self.max_tokens
+        return stats
+
+    def _trim_history(self, query):
+        """Drop the oldest line of the chat history message, or the message when nothing is left."""
+        for i, message in enumerate(query["messages"]):
+            if message["role"] == "system" and message["content"] != INSTRUCTIONS:
+                lines = message["content"][len(HISTORY_HEADER) + 1:].split("\n")
+                rest = "\n".join(lines[1:]).strip()
+                if rest:
+                    message["content"] = f"{HISTORY_HEADER}\n{rest}"
+                else:
+                    del query["messages"][i]
+                return
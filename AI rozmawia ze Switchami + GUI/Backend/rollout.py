@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+
+from dotenv import load_dotenv
+
+from nxapi import parse_commands
+
+load_dotenv()
+
+ROLLOUT_MIN_DEVICES = int(os.getenv("ROLLOUT_MIN_DEVICES", "10"))
+ROLLOUT_CANARY = int(os.getenv("ROLLOUT_CANARY", "1"))
+ROLLOUT_WAVE_SIZE = int(os.getenv("ROLLOUT_WAVE_SIZE", "50"))
+ROLLOUT_CONCURRENCY = int(os.getenv("ROLLOUT_CONCURRENCY", "16"))
+ROLLOUT_MAX_FAILURE_RATE = float(os.getenv("ROLLOUT_MAX_FAILURE_RATE", "0.1"))
+
+
+def device_status(response):
+    """
+    Reduce the NX-API response of one cli_conf request to
+    {"status": "applied" | "failed", "code", "msg"}. A device has failed
+    when the request failed or any command did not return code 200.
+    """
+    if "ins_api" not in response:
+        return {
+            "status": "failed",
+            "code": response.get("status_code"),
+            "msg": response.get("details") or response.get("error"),
+        }
+    outputs = response["ins_api"].get("outputs", {}).get("output", [])
+    if isinstance(outputs, dict):
+        outputs = [outputs]
+    for output in outputs:
+        if str(output.get("code")) != "200":
+            return {"status": "failed", "code": output.get("code"), "msg": output.get("msg")}
+    return {"status": "applied", "code": "200", "msg": "Success"}
+
+
+class Rollout:
+    """
+    Pushes one configuration to many devices in waves: a canary wave of
+    `canary` devices first, then waves of `wave_size`. At most `concurrency`
+    devices of a wave are configured at once. The rollout stops after any
+    canary failure, or after a wave when the failure rate so far is above
+    max_failure_rate; devices not reached are reported as skipped. With a
+    precheck (precheck.configure_missing bound to the client), devices only
+    get the commands they lack and those lacking none are reported unchanged.
+    Requests still go through the client's admission control, so
+    concurrency above its global limit (NXAPI_GLOBAL_CONCURRENCY) is capped
+    at that limit; the report gives the concurrency used and why.
+    Invalid settings raise ValueError.
+    """
+
+    def __init__(self, nxapi, canary=ROLLOUT_CANARY, wave_size=ROLLOUT_WAVE_SIZE,
+                 concurrency=ROLLOUT_CONCURRENCY, max_failure_rate=ROLLOUT_MAX_FAILURE_RATE, precheck=None):
+        if canary < 0:
+            raise ValueError(f"canary must be 0 or more, not {canary}")
+        if wave_size < 1:
+            raise ValueError(f"wave_size must be 1 or more, not {wave_size}")
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be 1 or more, not {concurrency}")
+        if not 0 <= max_failure_rate <= 1:
+            raise ValueError(f"max_failure_rate must be between 0 and 1, not {max_failure_rate}")
+        self.nxapi = nxapi
+        self.canary = canary
+        self.wave_size = wave_size
+        self.concurrency = concurrency
+        self.max_failure_rate = max_failure_rate
+        self.precheck = precheck
+        self.notice = None
+        limiter = getattr(nxapi, "limiter", None)
+        if limiter is not None and concurrency > limiter.total:
+            self.concurrency = limiter.total
+            self.notice = (f"concurrency {concurrency} capped at {limiter.total}, "
+                           f"the NX-API admission limit (NXAPI_GLOBAL_CONCURRENCY)")
+
+    def plan(self, devices):
+        waves = [devices[:self.canary]] if self.canary else []
+        rest = devices[self.canary:]
+        waves += [rest[i:i + self.wave_size] for i in range(0, len(rest), self.wave_size)]
+        return [wave for wave in waves if wave]
+
+    async def run(self, devices, commands, on_result=None):
+        commands = parse_commands(commands)
+        waves = self.plan(devices)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        report = {"status": "completed", "concurrency": self.concurrency, "waves": [], "devices": {}}
+        if self.notice:
+            report["notice"] = self.notice
+        applied = failed = unchanged = 0
+
+        async def configure(device, wave_number):
+            async with semaphore:
+                if self.precheck is not None:
+                    entry = (await self.precheck([device], commands))[device]
+                else:
+                    entry = device_status((await self.nxapi.configure([device], commands))[device])
+            entry = dict(entry, wave=wave_number)
+            report["devices"][device] = entry
+            if on_result is not None:
+                on_result(device, entry)
+            return entry
+
+        for wave_number, wave in enumerate(waves):
+            started = time.monotonic()
+            entries = await asyncio.gather(*(configure(device, wave_number) for device in wave))
+            wave_failed = sum(entry["status"] == "failed" for entry in entries)
+            wave_unchanged = sum(entry["status"] == "unchanged" for entry in entries)
+            applied += len(entries) - wave_failed - wave_unchanged
+            failed += wave_failed
+            unchanged += wave_unchanged
+            report["waves"].append({
+                "wave": wave_number,
+                "canary": bool(self.canary) and wave_number == 0,
+                "devices": len(wave),
+                "applied": len(wave) - wave_failed - wave_unchanged,
+                "unchanged": wave_unchanged,
+                "failed": wave_failed,
+                "seconds": round(time.monotonic() - started, 3),
+            })
+
+            failure_rate = failed / (applied + failed + unchanged)
+            if wave_number == 0 and self.canary and wave_failed:
+                reason = f"canary failed on {wave_failed} of {len(wave)} devices"
+            elif failure_rate > self.max_failure_rate:
+                reason = f"failure rate {failure_rate:.2f} above {self.max_failure_rate:.2f} after wave {wave_number}"
+            else:
+                continue
+            report["status"] = "aborted"
+            report["reason"] = reason
+            for device in (device for later in waves[wave_number + 1:] for device in later):
+                report["devices"][device] = {"status": "skipped", "code": None, "msg": f"Rollout aborted: {reason}"}
+                if on_result is not None:
+                    on_result(device, report["devices"][device])
+            break
+
+        report["devices"] = {device: report["devices"][device] for device in devices}
+        report["summary"] = {
+            "applied": applied,
+            "unchanged": unchanged,
+            "failed": failed,
+            "skipped": len(devices) - applied - unchanged - failed,
+            "failure_rate": round(failed / (applied + unchanged + failed), 3) if applied + unchanged + failed else 0.0,
+        }
+        return report
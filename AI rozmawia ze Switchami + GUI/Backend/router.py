@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import uuid
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.6"))
+
+HOST = r"[A-Za-z0-9][\w.:-]*[A-Za-z0-9]"
+DEVICES = re.compile(
+    rf"\b(?:on|na|switch\w*|device|urządzeniu)\s*:?\s+(?:switch\w*\s*:?\s*)?"
+    rf"(?P<devices>{HOST}(?:\s*(?:,|\band\b|\bi\b|\boraz\b)\s*{HOST})*)",
+    re.IGNORECASE,
+)
+# words that look like a device: an IPv4 address or a name with a digit (sw1, leaf-2a), not an interface (eth1/1)
+DEVICE_LIKE = re.compile(r"(?<![\w/.-])(?:\d{1,3}(?:\.\d{1,3}){3}|[A-Za-z][\w-]*\d[\w.-]*?)(?=[.:?!,]?(?:\s|$))")
+
+# show commands a free-form "show ... on <device>" may be routed with
+KNOWN_COMMANDS = (
+    "show vlan", "show interface", "show version", "show mac address-table", "show ip route",
+    "show ip interface", "show ip arp", "show cdp neighbors", "show lldp neighbors", "show inventory",
+    "show module", "show port-channel", "show spanning-tree", "show running-config", "show logging",
+    "show clock", "show hostname", "show environment", "show system resources",
+)
+
+# words that make a question read-only or a configuration request
+READ_WORDS = {
+    "is", "are", "check", "show", "status", "configured", "exists", "present", "what", "list",
+    "czy", "sprawdz", "sprawdź", "pokaz", "pokaż", "jest", "skonfigurowany", "istnieje", "jaki", "jakie",
+}
+WRITE_WORDS = {
+    "configure", "add", "create", "delete", "remove", "set", "change", "shutdown", "enable", "disable",
+    "skonfiguruj", "dodaj", "utwórz", "utworz", "usuń", "usun", "zmień", "zmien", "wyłącz", "włącz",
+}
+
+
+class Rule:
+    """
+    A regex over the question and the tool call it maps to. A rule matching
+    more than once is ambiguous and does not match. With commands, the
+    resulting commands must be one of them or start with one of them.
+    """
+
+    def __init__(self, name, pattern, show_cmd, commands=None):
+        self.name = name
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.show_cmd = show_cmd
+        self.commands = commands
+
+    def match(self, text):
+        matches = list(self.pattern.finditer(text))
+        if len(matches) != 1:
+            return None
+        show_cmd = [" ".join(command.format(**matches[0].groupdict()).lower().split()) for command in self.show_cmd]
+        if self.commands is not None and not all(
+            any(command == known or command.startswith(known + " ") for known in self.commands) for command in show_cmd
+        ):
+            return None
+        return show_cmd
+
+
+DEFAULT_RULES = [
+    Rule("vlan", r"\bvlan\s+(?P<vlan>\d{1,4})\b", ["show vlan id {vlan}"]),
+    Rule("interface_status", r"\b(?:interfaces?|interfejs\w*|port\w*)\s+status\b|\bstatus\w*\s+(?:interfaces?|interfejs\w*|port\w*)", ["show interface status"]),
+    Rule("mac_table", r"\bmac(?:\s+address)?[\s-]+table\b|\btablic\w*\s+mac\b", ["show mac address-table"]),
+    Rule("version", r"\b(?:version|wersj\w*)\b", ["show version"]),
+    Rule("show", r"\b(?P<command>show\s+[a-z][\w\s/-]*?)\s+(?:on|na)\b", ["{command}"], KNOWN_COMMANDS),
+]
+
+
+def classify(text):
+    """
+    Keyword classifier: returns (intent, confidence) with intent "read",
+    "configure" or "other". Any configuration word wins to stay on the safe side.
+    """
+    words = set(re.findall(r"\w+", text.lower()))
+    write = len(words & WRITE_WORDS)
+    read = len(words & READ_WORDS)
+    if write:
+        return "configure", 1.0
+    if read:
+        return "read", read / (read + 0.5)
+    return "other", 0.0
+
+
+class Router:
+    """
+    Fast path in front of the decision model: when a question is read-only,
+    matches exactly one rule and every device it names was recognized, the
+    tool call is built locally and the decision call is skipped. Anything
+    uncertain (several questions, several device lists) falls back to the model.
+    """
+
+    def __init__(self, rules=None, classifier=classify, inventory=None, min_confidence=ROUTER_MIN_CONFIDENCE):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.classifier = classifier
+        self.inventory = inventory
+        self.min_confidence = min_confidence
+        self.fast_path = 0
+        self.fallback = 0
+        self.rule_hits = {}
+        self._decision_seconds = 0.0
+        self._decisions = 0
+        self._lock = threading.Lock()
+
+    def add_rule(self, rule):
+        self.rules.insert(0, rule)
+
+    def devices(self, text):
+        match = DEVICES.search(text)
+        if match is None:
+            return []
+        devices = re.split(r"\s*(?:,|\band\b|\bi\b|\boraz\b)\s*", match.group("devices"))
+        devices = [device.rstrip(".:?") for device in devices if device]
+        # plain words ("the", "switch") are not device names unless the inventory knows them,
+        # the list ends at the first one
+        names = []
+        for device in devices:
+            known = self.inventory is not None and self.inventory.get(device)
+            if not known and not re.search(r"[\d.-]", device):
+                break
+            names.append(device)
+        return names
+
+    def all_devices_captured(self, text, devices):
+        """Whether every device-like word of the question is in devices."""
+        captured = {device.lower() for device in devices}
+        mentioned = {word.lower() for word in DEVICE_LIKE.findall(text)}
+        if self.inventory is not None:
+            mentioned |= {word.lower() for word in re.findall(r"[\w.:-]+", text) if self.inventory.get(word.rstrip(".:?"))}
+            mentioned = {word.rstrip(".:?") for word in mentioned}
+        return mentioned <= captured
+
+    def route(self, user_input):
+        """Return the tool calls for the question, or None to ask the model."""
+        intent, confidence = self.classifier(user_input)
+        tool_calls = None
+        if intent == "read" and confidence >= self.min_confidence:
+            devices = self.devices(user_input)
+            # rules giving the same commands (vlan and show for "show vlan id 10") count once
+            matches = {}
+            for candidate in self.rules:
+                show_cmd = candidate.match(user_input)
+                if show_cmd:
+                    matches.setdefault(tuple(show_cmd), candidate)
+            if devices and len(matches) == 1 and self.all_devices_captured(user_input, devices):
+                (show_cmd, rule), = matches.items()
+                show_cmd = list(show_cmd)
+                tool_calls = [{
+                    "id": f"fastpath-{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {
+                        "name": "get_info_from_devices",
+                        "arguments": json.dumps({"device_ips": devices, "show_cmd": show_cmd}),
+                    },
+                }]
+
+        with self._lock:
+            if tool_calls:
+                self.fast_path += 1
+                self.rule_hits[rule.name] = self.rule_hits.get(rule.name, 0) + 1
+            else:
+                self.fallback += 1
+        return tool_calls
+
+    def record_decision(self, seconds):
+        """Latency of a decision call made by the model, used to estimate the time saved."""
+        with self._lock:
+            self._decision_seconds += seconds
+            self._decisions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.fast_path + self.fallback
+            average = self._decision_seconds / self._decisions if self._decisions else 0.0
+            return {
+                "fast_path": self.fast_path,
+                "fallback": self.fallback,
+                "fast_path_ratio": self.fast_path / total if total else 0.0,
+                "rule_hits": dict(self.rule_hits),
+                "avg_decision_seconds": average,
+                "saved_seconds": self.fast_path * average,
+            }
@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_ENTRIES = int(os.getenv("SHOW_CACHE_SIZE", "1024"))
+DEFAULT_TTL = float(os.getenv("SHOW_CACHE_TTL", "30"))
+
+# how many seconds an output stays valid, by command prefix (first match wins)
+COMMAND_TTLS = (
+    ("show clock", 0),
+    ("show logging", 5),
+    ("show interface", 10),
+    ("show mac address-table", 10),
+    ("show ip arp", 10),
+    ("show vlan", 60),
+    ("show run", 60),
+    ("show version", 3600),
+    ("show inventory", 3600),
+)
+
+
+def normalize_command(command):
+    return " ".join(command.lower().split())
+
+
+class ShowCache:
+    """
+    In-process LRU cache of show command outputs keyed by device and
+    normalized command, with a TTL depending on the kind of command.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, default_ttl=DEFAULT_TTL, ttls=COMMAND_TTLS):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = ttls
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl_for(self, command):
+        command = normalize_command(command)
+        for prefix, ttl in self.ttls:
+            if command.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def _key(self, device, command, cmd_type):
+        return (device.lower(), cmd_type, normalize_command(command))
+
+    def get(self, device, command, cmd_type="cli_show_ascii"):
+        key = self._key(device, command, cmd_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, device, command, output, cmd_type="cli_show_ascii"):
+        ttl = self.ttl_for(command)
+        if ttl <= 0:
+            return
+        key = self._key(device, command, cmd_type)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, output)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_device(self, device):
+        device = device.lower()
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == device]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,85 @@
+import os
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") == "1"
+
+# result handed to waiters when the leader was cancelled, they make the call again
+ABANDONED = object()
+
+
+class SingleFlight:
+    """
+    In-flight deduplication for asyncio: while one caller (the leader) runs
+    the call for a key, concurrent callers with the same key wait for its
+    result instead of making the call again. A leader being cancelled (its
+    client went away) is not a failure of the call: waiters retry and one
+    of them becomes the new leader. Nothing is kept once the call is done,
+    caching is left to ShowCache.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.saved = 0
+        self._futures = {}
+
+    def join(self, key):
+        """Future of the call in flight for key, or None if there is none."""
+        future = self._futures.get(key)
+        if future is not None:
+            self.saved += 1
+        return future
+
+    def lead(self, key):
+        """Register the caller as leader for key; it must call finish(key, ...) afterwards."""
+        future = asyncio.get_running_loop().create_future()
+        # waiters may all be gone by the time an error is set
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._futures[key] = future
+        self.calls += 1
+        return future
+
+    def finish(self, key, result=None, error=None):
+        future = self._futures.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def abandon(self, key):
+        """The leader was cancelled, waiters get ABANDONED and retry."""
+        self.finish(key, ABANDONED)
+
+    async def wait(self, future):
+        """Result of the leader's call, or ABANDONED when the leader was cancelled."""
+        # a waiter being cancelled must not cancel the leader's call
+        return await asyncio.shield(future)
+
+    async def do(self, key, func):
+        """Run func() once for all concurrent callers with the same key."""
+        while True:
+            future = self.join(key)
+            if future is None:
+                break
+            result = await self.wait(future)
+            if result is not ABANDONED:
+                return result
+        self.lead(key)
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            self.abandon(key)
+            raise
+        except BaseException as e:
+            self.finish(key, error=e if isinstance(e, Exception) else RuntimeError("Shared call failed"))
+            raise
+        self.finish(key, result)
+        return result
+
+    def stats(self):
+        return {"calls": self.calls, "saved": self.saved, "in_flight": len(self._futures)}
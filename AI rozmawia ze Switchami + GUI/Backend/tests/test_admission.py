@@ -0,0 +1,86 @@
+import asyncio
+
+from admission import FairLimiter
+
+
+async def use(limiter, device, session, name, served, hold=0.01):
+    async with limiter.slot(device, session):
+        served.append(name)
+        await asyncio.sleep(hold)
+
+
+def test_sessions_waiting_for_a_busy_device_are_served_round_robin():
+    async def scenario():
+        limiter = FairLimiter(total=10, per_device=1)
+        served = []
+        await limiter.acquire("sw1", "holder")
+        # a fleet-wide query of session a is queued before session b asks anything
+        tasks = [asyncio.ensure_future(use(limiter, "sw1", "a", f"a{i}", served)) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(use(limiter, "sw1", "b", f"b{i}", served)) for i in range(2)]
+        await asyncio.sleep(0)
+        assert limiter.depth() == {"a": 4, "b": 2}
+        limiter.release("sw1")
+        await asyncio.gather(*tasks)
+        return served, limiter.stats()
+
+    served, stats = asyncio.run(scenario())
+    assert served == ["a0", "b0", "a1", "b1", "a2", "a3"]
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_per_device_limit_does_not_hold_back_other_devices():
+    async def scenario():
+        limiter = FairLimiter(total=10, per_device=2)
+        served = []
+        busy = [asyncio.ensure_future(use(limiter, "sw1", "a", f"sw1-{i}", served, hold=0.05)) for i in range(3)]
+        await asyncio.sleep(0)
+        during = dict(limiter.stats()["active_by_device"]), limiter.depth()
+        # the same session's request to another device goes ahead of its third sw1 request
+        await use(limiter, "sw2", "a", "sw2", served, hold=0)
+        await asyncio.gather(*busy)
+        return served, during
+
+    served, (active, depth) = asyncio.run(scenario())
+    assert active == {"sw1": 2}
+    assert depth == {"a": 1}
+    assert served.index("sw2") < served.index("sw1-2")
+
+
+def test_global_limit_spans_devices():
+    async def scenario():
+        limiter = FairLimiter(total=2, per_device=2)
+        running = []
+        peak = 0
+
+        async def run(device, session):
+            nonlocal peak
+            async with limiter.slot(device, session):
+                running.append(device)
+                peak = max(peak, len(running))
+                await asyncio.sleep(0.01)
+                running.remove(device)
+
+        await asyncio.gather(*(run(f"sw{i}", f"s{i % 2}") for i in range(6)))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        limiter = FairLimiter(total=10, per_device=1)
+        served = []
+        await limiter.acquire("sw1", "holder")
+        cancelled = asyncio.ensure_future(use(limiter, "sw1", "a", "a0", served))
+        waiting = asyncio.ensure_future(use(limiter, "sw1", "b", "b0", served))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.release("sw1")
+        await waiting
+        return served, limiter.stats()
+
+    served, stats = asyncio.run(scenario())
+    assert served == ["b0"]
+    assert stats["active"] == 0 and stats["queued"] == 0
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from openai.types.chat import ChatCompletion
+
+from assistant import NetworkAssistant
+from async_assistant import AsyncNetworkAssistant
+from llm_cache import LLMCache
+
+
+def completion(name, arguments):
+    return ChatCompletion.model_validate({
+        "id": "c1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-3.5-turbo-16k",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "tool_calls",
+            "message": {"role": "assistant", "content": None, "tool_calls": [{
+                "id": "t1",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }]},
+        }],
+    })
+
+
+class Completions:
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    def create(self, **query):
+        self.calls += 1
+        return self.response
+
+
+class AsyncCompletions(Completions):
+    async def create(self, **query):
+        return Completions.create(self, **query)
+
+
+class Client:
+    def __init__(self, completions):
+        self.chat = type("Chat", (), {"completions": completions})()
+
+
+def query(question):
+    return {"model": "gpt-3.5-turbo-16k", "messages": [{"role": "user", "content": question}]}
+
+
+def test_configuring_decision_is_not_cached():
+    cache = LLMCache(path="")
+    assistant = NetworkAssistant(api_key="x", nxapi_client=object(), llm_cache=cache)
+    completions = Completions(completion("configure_devices", {"device_ips": "sw1", "configuration_cmd": "vlan 13"}))
+    assistant.client = Client(completions)
+
+    # the classifier doesn't see a configuration request in this phrasing
+    assistant.complete(query("put vlan 13 on sw1 please"))
+    assistant.complete(query("put vlan 13 on sw1 please"))
+    assert completions.calls == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_show_decision_is_cached():
+    cache = LLMCache(path="")
+    assistant = NetworkAssistant(api_key="x", nxapi_client=object(), llm_cache=cache)
+    completions = Completions(completion("get_info_from_devices", {"device_ips": "sw1", "show_cmd": "show vlan brief"}))
+    assistant.client = Client(completions)
+
+    assistant.complete(query("list vlans on sw1"))
+    assistant.complete(query("list vlans on sw1"))
+    assert completions.calls == 1
+
+
+def test_async_configuring_decision_is_not_cached():
+    async def scenario():
+        cache = LLMCache(path="")
+        assistant = AsyncNetworkAssistant(api_key="x", nxapi_client=object(), llm_cache=cache)
+        completions = AsyncCompletions(completion("configure_devices", {"device_ips": "sw1", "configuration_cmd": "vlan 13"}))
+        assistant.client = Client(completions)
+        await assistant.complete(query("put vlan 13 on sw1 please"))
+        await assistant.complete(query("put vlan 13 on sw1 please"))
+        return completions.calls, cache.stats()["entries"]
+
+    assert asyncio.run(scenario()) == (2, 0)
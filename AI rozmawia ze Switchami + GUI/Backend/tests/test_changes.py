@@ -0,0 +1,90 @@
+import json
+
+from changes import ChangeTracker
+from nxos_tables import compact_result
+
+
+def vlans(*rows):
+    return {"TABLE_vlanbriefxbrief": {"ROW_vlanbriefxbrief": [
+        {"vlanshowbr-vlanid": vlan_id, "vlanshowbr-vlanname": name} for vlan_id, name in rows
+    ]}}
+
+
+def result(body):
+    return {"sw1": {"show vlan brief": {"code": "200", "body": body}}}
+
+
+def tool_message(compact):
+    return {"role": "tool", "tool_call_id": "1", "content": json.dumps(compact)}
+
+
+def test_baseline_from_an_earlier_request_is_sent_in_full():
+    tracker = ChangeTracker()
+    first = result(vlans((1, "default")))
+    compact_result(first, "list vlans", tracker.track(first, []))
+
+    second = result(vlans((1, "default"), (13, "LUCKY_VLAN")))
+    entry = compact_result(second, "list vlans", tracker.track(second, []))["sw1"]["show vlan brief"]
+    assert len(entry["tables"]["vlanbriefxbrief"]["rows"]) == 2
+    assert entry["diff"]["tables"]["vlanbriefxbrief"]["added"][0]["vlanshowbr-vlanid"] == 13
+
+
+def test_baseline_in_the_request_is_sent_as_a_difference():
+    tracker = ChangeTracker()
+    first = result(vlans((1, "default")))
+    messages = [tool_message(compact_result(first, "list vlans", tracker.track(first, [])))]
+
+    second = result(vlans((1, "default"), (13, "LUCKY_VLAN")))
+    entry = compact_result(second, "list vlans", tracker.track(second, messages))["sw1"]["show vlan brief"]
+    assert "tables" not in entry
+    assert entry["diff"]["tables"]["vlanbriefxbrief"]["added"][0]["vlanshowbr-vlanname"] == "LUCKY_VLAN"
+
+    messages.append(tool_message({"sw1": {"show vlan brief": entry}}))
+    entry = compact_result(second, "list vlans", tracker.track(second, messages))["sw1"]["show vlan brief"]
+    assert entry["unchanged"] is True and "tables" not in entry
+
+
+def interfaces(counter, state="up"):
+    return {"TABLE_interface": {"ROW_interface": [
+        {"interface": f"Ethernet1/{i}", "state": state if i == 1 else "up",
+         "eth_inpkts": counter * i, "eth_outpkts": counter * i + 1, "eth_inbytes": counter * i * 64}
+        for i in range(1, 41)
+    ]}}
+
+
+def interface_result(body):
+    return {"sw1": {"show interface": {"code": "200", "body": body}}}
+
+
+def test_difference_leaves_out_columns_not_asked_about():
+    tracker = ChangeTracker()
+    first = interface_result(interfaces(100))
+    compact_result(first, "show interface state", tracker.track(first, []))
+
+    second = interface_result(interfaces(200))
+    plain = compact_result(second, "show interface state")
+    entry = compact_result(second, "show interface state", tracker.track(second, []))["sw1"]["show interface"]
+    assert "diff" not in entry and entry["unchanged"] is True
+    assert len(json.dumps(entry)) < len(json.dumps(plain["sw1"]["show interface"])) + 64
+
+
+def test_difference_keeps_changes_of_projected_columns():
+    tracker = ChangeTracker()
+    first = interface_result(interfaces(100))
+    compact_result(first, "show interface state", tracker.track(first, []))
+
+    second = interface_result(interfaces(200, state="down"))
+    entry = compact_result(second, "show interface state", tracker.track(second, []))["sw1"]["show interface"]
+    changed = entry["diff"]["tables"]["interface"]["changed"]
+    assert changed == [{"interface": "Ethernet1/1", "before": {"state": "up"}, "after": {"state": "down"}}]
+
+
+def test_difference_larger_than_the_output_is_left_out():
+    tracker = ChangeTracker()
+    first = result(vlans(*[(i, f"v{i}") for i in range(1, 30)]))
+    messages = [tool_message(compact_result(first, "list vlans", tracker.track(first, [])))]
+
+    second = result(vlans(*[(i, f"renamed{i}") for i in range(1, 30)]))
+    entry = compact_result(second, "list vlans", tracker.track(second, messages))["sw1"]["show vlan brief"]
+    assert "diff" not in entry
+    assert len(entry["tables"]["vlanbriefxbrief"]["rows"]) == 29
@@ -0,0 +1,52 @@
+from history import HistoryManager, turn_tokens
+
+
+def turns(count):
+    return [{"type": "Human" if i % 2 == 0 else "AI", "content": f"message {i}"} for i in range(count)]
+
+
+def test_stats_are_returned_per_call():
+    history = HistoryManager(keep_turns=2)
+    long_text, long_stats = history.compact_with_stats(turns(6))
+    short_text, short_stats = history.compact_with_stats(turns(1))
+
+    assert "Summary of earlier conversation" in long_text
+    assert long_stats["summarized_turns"] == 4
+    assert len(long_stats["turns"]) == 2
+    assert short_stats["summarized_turns"] == 0
+    assert len(short_stats["turns"]) == 1
+    assert short_text == "Human: message 0"
+
+
+def test_gauge_reads_the_last_compacted_history():
+    history = HistoryManager(keep_turns=2)
+    assert history.gauge_values() == {}
+
+    history.compact(turns(3) + [{"type": "tool", "content": "{'ins_api': {}}"}])
+    values = history.gauge_values()
+    assert values["verbatim_turns"] == 2
+    assert values["summarized_turns"] == 1
+    assert values["dropped_turns"] == 1
+    assert values["total_tokens"] == values["verbatim_tokens"] + values["summary_tokens"]
+
+
+def test_summaries_are_not_shared_between_settings():
+    def upper(summary, older):
+        return "\n".join(turn["content"].upper() for turn in older)
+
+    history = turns(6)
+    default = HistoryManager(keep_turns=2).compact(history)
+    custom = HistoryManager(keep_turns=2, summarize=upper).compact(history)
+    shorter = HistoryManager(keep_turns=2, summary_max_tokens=5).compact(history)
+
+    assert "MESSAGE 0" not in default and "MESSAGE 0" in custom
+    assert shorter != default
+
+
+def test_turn_tokens_are_counted_once():
+    history = HistoryManager(keep_turns=2)
+    chat = turns(4) + [{"type": "Human", "content": "a turn seen only in this test"}]
+    history.compact(chat)
+    misses = turn_tokens.cache_info().misses
+    history.compact(chat)
+    assert turn_tokens.cache_info().misses == misses
@@ -0,0 +1,42 @@
+import threading
+
+from nxapi import NxapiClient
+from show_cache import ShowCache
+
+
+def response(body):
+    return {"ins_api": {"outputs": {"output": [{"code": "200", "msg": "Success", "body": body}]}}}
+
+
+def test_show_started_before_configure_is_not_cached():
+    client = NxapiClient(username="u", password="p", cache=ShowCache())
+    shown = threading.Event()
+    release = threading.Event()
+
+    def post(device_ip, payload):
+        if payload["ins_api"]["type"] == "cli_conf":
+            return response(None)
+        shown.set()
+        # the show's old output arrives only after the configure has invalidated the cache
+        release.wait(5)
+        return response("before")
+
+    client.post = post
+    results = {}
+    show = threading.Thread(target=lambda: results.update(client.show(["sw1"], ["show vlan brief"])))
+    show.start()
+    assert shown.wait(5)
+    client.configure(["sw1"], ["vlan 13"])
+    release.set()
+    show.join(5)
+
+    assert results["sw1"]["show vlan brief"]["body"] == "before"
+    assert client.cache.get("sw1", "show vlan brief") is None
+
+
+def test_show_after_configure_is_cached():
+    client = NxapiClient(username="u", password="p", cache=ShowCache())
+    client.post = lambda device_ip, payload: response("after")
+    client.configure(["sw1"], ["vlan 13"])
+    client.show(["sw1"], ["show vlan brief"])
+    assert client.cache.get("sw1", "show vlan brief")["body"] == "after"
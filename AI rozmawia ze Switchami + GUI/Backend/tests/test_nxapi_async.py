@@ -0,0 +1,94 @@
+import asyncio
+
+from nxapi_async import AsyncNxapiClient
+from show_cache import ShowCache
+from singleflight import SingleFlight
+
+
+def response(body):
+    return {"ins_api": {"outputs": {"output": [{"code": "200", "msg": "Success", "body": body}]}}}
+
+
+def test_show_after_configure_does_not_join_or_cache_an_older_call():
+    async def scenario():
+        client = AsyncNxapiClient(username="u", password="p", cache=ShowCache(), inflight=SingleFlight())
+        release = asyncio.Event()
+        shows = []
+
+        async def post(device_ip, payload):
+            if payload["ins_api"]["type"] == "cli_conf":
+                return response(None)
+            shows.append(payload)
+            if len(shows) == 1:
+                await release.wait()
+                return response("before")
+            return response("after")
+
+        client.post = post
+        before = asyncio.ensure_future(client.show(["sw1"], ["show vlan brief"]))
+        await asyncio.sleep(0)
+        await client.configure(["sw1"], ["vlan 13"])
+        # joining the call started before the change would wait for release forever
+        after = await asyncio.wait_for(client.show(["sw1"], ["show vlan brief"]), 5)
+        release.set()
+        await before
+        cached = client.cache.get("sw1", "show vlan brief")
+        await client.aclose()
+        return after, len(shows), cached
+
+    after, calls, cached = asyncio.run(scenario())
+    assert after["sw1"]["show vlan brief"]["body"] == "after"
+    assert calls == 2
+    assert cached["body"] == "after"
+
+
+def test_truncated_chunked_output_closes_the_chunk_reader():
+    async def scenario():
+        client = AsyncNxapiClient(username="u", password="p")
+        closed = []
+
+        async def iter_show(device_ip, command, cmd_type="cli_show_ascii"):
+            try:
+                while True:
+                    yield "x" * 10
+            finally:
+                closed.append(command)
+
+        client.iter_show = iter_show
+        read = await client.read_chunked("sw1", "show running-config", max_output=25)
+        # checked before the loop ends, which would close a forgotten generator too
+        was_closed = list(closed)
+        await client.aclose()
+        return read, was_closed
+
+    read, closed = asyncio.run(scenario())
+    assert read["truncated"] and len(read["body"]) == 25
+    assert closed == ["show running-config"]
+
+
+def test_show_joined_to_a_cancelled_show_asks_the_device_itself():
+    async def scenario():
+        client = AsyncNxapiClient(username="u", password="p", inflight=SingleFlight())
+        posts = []
+        release = asyncio.Event()
+
+        async def post(device_ip, payload):
+            posts.append(payload)
+            await release.wait()
+            return response(f"output {len(posts)}")
+
+        client.post = post
+        first = asyncio.ensure_future(client.show(["sw1"], ["show vlan brief"]))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(client.show(["sw1"], ["show vlan brief"]))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        output = await asyncio.wait_for(second, 5)
+        await client.aclose()
+        return output, len(posts)
+
+    output, calls = asyncio.run(scenario())
+    assert output["sw1"]["show vlan brief"]["body"] == "output 2"
+    assert calls == 2
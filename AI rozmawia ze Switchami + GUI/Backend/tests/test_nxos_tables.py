@@ -0,0 +1,61 @@
+from nxos_tables import compact_result, project
+
+
+def interface_status():
+    return {
+        "TABLE_interface": {
+            "ROW_interface": [
+                {"interface": "Ethernet1/1", "state": "connected", "vlan": "10", "speed": "10G", "type": "10Gbase-SR"},
+                {"interface": "Ethernet1/2", "state": "notconnect", "vlan": "13", "speed": "auto", "type": "10Gbase-SR"},
+            ]
+        }
+    }
+
+
+def vlan_brief():
+    return {
+        "TABLE_vlanbriefxbrief": {
+            "ROW_vlanbriefxbrief": [
+                {"vlanshowbr-vlanid": 1, "vlanshowbr-vlanname": "default", "vlanshowbr-vlanstate": "active"},
+                {"vlanshowbr-vlanid": 13, "vlanshowbr-vlanname": "LUCKY_VLAN", "vlanshowbr-vlanstate": "active"},
+            ]
+        }
+    }
+
+
+def table(result, device, command):
+    return next(iter(result[device][command]["tables"].values()))
+
+
+def test_device_name_is_not_a_row_filter():
+    result = {"sw1": {"show interface status": {"code": "200", "body": interface_status()}}}
+    compact = compact_result(result, "show interface status on sw1", exclude={"sw1"})
+    rows = table(compact, "sw1", "show interface status")
+    assert len(rows["rows"]) == 2
+    assert "filter" not in rows
+
+
+def test_device_address_is_not_a_row_filter():
+    result = {"10.0.0.5": {"show interface status": {"code": "200", "body": interface_status()}}}
+    compact = compact_result(result, "which ports are down on 10.0.0.5?", exclude={"10.0.0.5"})
+    assert len(table(compact, "10.0.0.5", "show interface status")["rows"]) == 2
+
+
+def test_unmatched_filter_keeps_all_rows():
+    parsed = project({"fields": {}, "tables": {"interface": interface_status()["TABLE_interface"]["ROW_interface"]}},
+                     "is port 4/48 up?")
+    assert len(parsed["tables"]["interface"]["rows"]) == 2
+    assert "filter" not in parsed["tables"]["interface"]
+
+
+def test_matching_filter_keeps_matching_rows():
+    result = {"sw1": {"show vlan brief": {"code": "200", "body": vlan_brief()}}}
+    rows = table(compact_result(result, "is vlan 13 on sw1?", exclude={"sw1"}), "sw1", "show vlan brief")
+    assert rows["filter"] == ["13"]
+    assert [row["vlanshowbr-vlanid"] for row in rows["rows"]] == [13]
+
+
+def test_key_column_is_always_kept():
+    result = {"sw1": {"show interface status": {"code": "200", "body": interface_status()}}}
+    rows = table(compact_result(result, "which ports are down on the switch?"), "sw1", "show interface status")["rows"]
+    assert all("interface" in row and "state" in row for row in rows)
@@ -0,0 +1,47 @@
+import time
+import asyncio
+import threading
+
+from async_assistant import AsyncNetworkAssistant
+from poller import SnapshotStore
+
+
+def test_invalidate_drops_snapshots_and_rejects_older_outputs():
+    store = SnapshotStore(":memory:")
+    taken = time.time()
+    store.put("sw1", "show vlan brief", {"code": "200", "body": "old"}, taken)
+    store.invalidate("SW1")
+    assert store.latest("sw1", "show vlan brief") is None
+
+    # a poll started before the change finishes afterwards
+    assert store.put("sw1", "show vlan brief", {"code": "200", "body": "old"}, taken) is None
+    assert store.latest("sw1", "show vlan brief") is None
+
+    store.put("sw1", "show vlan brief", {"code": "200", "body": "new"})
+    assert store.latest("sw1", "show vlan brief")[2]["body"] == "new"
+
+
+def test_configure_forgets_snapshots_off_the_event_loop():
+    class Store(SnapshotStore):
+        def invalidate(self, *devices):
+            self.thread = threading.current_thread()
+            super().invalidate(*devices)
+
+    class Nxapi:
+        async def show(self, device_ips, commands, use_cache=True):
+            return {}
+
+        async def configure(self, device_ips, commands, on_result=None):
+            return {device: {"ins_api": {}} for device in device_ips}
+
+    async def scenario():
+        assistant = AsyncNetworkAssistant(api_key="x", nxapi_client=Nxapi())
+        assistant.snapshots = Store(":memory:")
+        assistant.snapshots.put("sw1", "show vlan brief", {"code": "200", "body": "old"})
+        assistant.targets = lambda devices: ["sw1"]
+        await assistant.configure_devices(device_ips="sw1", configuration_cmd="vlan 13")
+        return assistant.snapshots
+
+    store = asyncio.run(scenario())
+    assert store.thread is not threading.main_thread()
+    assert store.latest("sw1", "show vlan brief") is None
@@ -0,0 +1,47 @@
+import asyncio
+
+from precheck import PRECHECK_COMMAND, configure_missing, plan
+
+RUNNING_CONFIG = """\
+!Command: show running-config
+hostname sw1
+vlan 1,10,13
+vlan 10
+  name TEN
+interface Ethernet1/1
+  description uplink
+  no shutdown
+"""
+
+
+def test_present_commands_are_not_pushed():
+    assert plan(RUNNING_CONFIG, ["vlan 10", "name TEN", "interface eth1/1", "no shutdown"])[0] == []
+
+
+def test_missing_commands_are_pushed_with_their_mode():
+    push, missing, present = plan(RUNNING_CONFIG, ["vlan 13", "name LUCKY_VLAN"])
+    assert push == ["vlan 13", "name LUCKY_VLAN"]
+    assert missing == ["name LUCKY_VLAN"]
+    assert present == ["vlan 13"]
+
+
+class FakeClient:
+    def __init__(self):
+        self.show_calls = []
+        self.configured = []
+
+    async def show(self, devices, commands, use_cache=True):
+        self.show_calls.append(use_cache)
+        return {device: {PRECHECK_COMMAND: {"code": "200", "body": RUNNING_CONFIG}} for device in devices}
+
+    async def configure(self, devices, commands, on_result=None):
+        self.configured.append((devices, commands))
+        return {device: {"ins_api": {"outputs": {"output": [{"code": "200"}]}}} for device in devices}
+
+
+def test_running_config_is_read_from_the_device():
+    client = FakeClient()
+    results = asyncio.run(configure_missing(client, ["sw1"], ["vlan 10", "name TEN"]))
+    assert client.show_calls == [False]
+    assert client.configured == []
+    assert results["sw1"]["status"] == "unchanged"
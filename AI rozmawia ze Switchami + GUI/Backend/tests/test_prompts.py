@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from history import count_tokens
+from prompts import HISTORY_HEADER, PromptBuilder, PromptTooLarge
+
+
+def history(turns):
+    return "\n".join(f"{'Human' if i % 2 == 0 else 'AI'}: turn {i} " + "word " * 20 for i in range(turns))
+
+
+def with_tool_result(builder, chat_history, result_tokens):
+    query = builder.build("and on sw2?", chat_history)
+    query["messages"] += [
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "1", "type": "function", "function": {
+            "name": "get_info_from_devices", "arguments": json.dumps({"device_ips": "sw2", "show_cmd": "show vlan"})}}]},
+        {"role": "tool", "tool_call_id": "1", "content": "x" * result_tokens * 4},
+    ]
+    return query
+
+
+def history_message(query):
+    return next((m["content"] for m in query["messages"] if m["content"] and m["content"].startswith(HISTORY_HEADER)), None)
+
+
+def test_tool_results_are_shortened_before_the_history():
+    builder = PromptBuilder(max_tokens=6000, min_tool_tokens=1000)
+    query = with_tool_result(builder, history(8), 20000)
+    stats = builder.fit(query)
+
+    assert stats["total"] <= 6000
+    assert history_message(query) == f"{HISTORY_HEADER}\n{history(8)}"
+    assert count_tokens(query["messages"][-1]["content"]) > 1000
+
+
+def test_oldest_history_goes_once_tool_results_are_at_their_minimum():
+    builder = PromptBuilder(min_tool_tokens=1000)
+    base = builder.count(with_tool_result(builder, "", 1000))["total"]
+    builder.max_tokens = base + 100
+    query = with_tool_result(builder, history(8), 20000)
+    stats = builder.fit(query)
+
+    assert stats["total"] <= builder.max_tokens
+    kept = history_message(query)
+    assert kept is not None and "turn 7" in kept and "turn 0" not in kept
+    assert count_tokens(query["messages"][-1]["content"]) >= 1000
+
+
+def test_request_over_the_limit_without_history_or_results_raises():
+    builder = PromptBuilder(max_tokens=100)
+    with pytest.raises(PromptTooLarge):
+        builder.fit(builder.build("hello", ""))
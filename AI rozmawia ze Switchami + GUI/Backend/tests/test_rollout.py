@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from admission import FairLimiter
+from rollout import Rollout
+
+
+def response(code):
+    return {"ins_api": {"outputs": {"output": [{"code": code, "msg": "Success" if code == "200" else "Syntax error"}]}}}
+
+
+class Nxapi:
+    """Configures devices instantly, failing the ones in failing."""
+
+    def __init__(self, failing=(), limiter=None):
+        self.failing = set(failing)
+        self.limiter = limiter
+        self.configured = []
+        self.running = 0
+        self.max_running = 0
+
+    async def configure(self, device_ips, commands, on_result=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        self.configured += device_ips
+        return {device: response("400" if device in self.failing else "200") for device in device_ips}
+
+
+def devices(count):
+    return [f"sw{i}" for i in range(count)]
+
+
+def test_canary_failure_skips_every_other_device():
+    nxapi = Nxapi(failing={"sw0"})
+    reported = {}
+    report = asyncio.run(Rollout(nxapi, canary=1, wave_size=3).run(devices(7), "vlan 13", reported.__setitem__))
+
+    assert report["status"] == "aborted" and "canary" in report["reason"]
+    assert nxapi.configured == ["sw0"]
+    assert report["summary"] == {"applied": 0, "unchanged": 0, "failed": 1, "skipped": 6, "failure_rate": 1.0}
+    assert all(reported[device]["status"] == "skipped" for device in devices(7)[1:])
+
+
+def test_failure_rate_above_the_limit_stops_after_the_wave():
+    nxapi = Nxapi(failing={"sw2", "sw3"})
+    report = asyncio.run(Rollout(nxapi, canary=1, wave_size=3, max_failure_rate=0.25).run(devices(10), "vlan 13"))
+
+    assert report["status"] == "aborted" and "after wave 1" in report["reason"]
+    assert [wave["failed"] for wave in report["waves"]] == [0, 2]
+    assert sorted(nxapi.configured) == devices(4)
+    assert {report["devices"][device]["status"] for device in devices(10)[4:]} == {"skipped"}
+    assert report["summary"]["skipped"] == 6
+
+
+def test_failures_under_the_limit_complete_every_wave():
+    nxapi = Nxapi(failing={"sw5"})
+    report = asyncio.run(Rollout(nxapi, canary=1, wave_size=3, max_failure_rate=0.5).run(devices(10), "vlan 13"))
+
+    assert report["status"] == "completed"
+    assert [wave["devices"] for wave in report["waves"]] == [1, 3, 3, 3]
+    assert report["summary"]["failed"] == 1 and report["summary"]["skipped"] == 0
+
+
+@pytest.mark.parametrize("settings", [
+    {"canary": -1}, {"wave_size": 0}, {"wave_size": -5}, {"concurrency": 0}, {"max_failure_rate": 1.5},
+])
+def test_invalid_settings_are_rejected(settings):
+    with pytest.raises(ValueError):
+        Rollout(Nxapi(), **settings)
+
+
+def test_concurrency_over_the_admission_limit_is_capped_and_reported():
+    async def scenario():
+        limiter = FairLimiter(total=4, per_device=2)
+        nxapi = Nxapi(limiter=limiter)
+        report = await Rollout(nxapi, canary=0, wave_size=20, concurrency=16).run(devices(20), "vlan 13")
+        return nxapi, report
+
+    nxapi, report = asyncio.run(scenario())
+    assert report["concurrency"] == 4
+    assert "NXAPI_GLOBAL_CONCURRENCY" in report["notice"]
+    assert nxapi.max_running <= 4
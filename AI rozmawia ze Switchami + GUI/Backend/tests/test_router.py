@@ -0,0 +1,36 @@
+import json
+
+from inventory import Device, Inventory
+from router import Router
+
+
+def routed(question, inventory=None):
+    tool_calls = Router(inventory=inventory).route(question)
+    if tool_calls is None:
+        return None
+    return json.loads(tool_calls[0]["function"]["arguments"])
+
+
+def test_simple_question_is_routed():
+    assert routed("is vlan 13 on sw1?") == {"device_ips": ["sw1"], "show_cmd": ["show vlan id 13"]}
+
+
+def test_known_show_command_is_routed():
+    assert routed("show interface status on sw1") == {"device_ips": ["sw1"], "show_cmd": ["show interface status"]}
+
+
+def test_two_questions_go_to_the_model():
+    assert routed("what version is running on sw1 and is vlan 10 on sw2?") is None
+
+
+def test_uncaptured_device_goes_to_the_model():
+    assert routed("is vlan 13 on sw1 the same as on sw2?") is None
+
+
+def test_uncaptured_inventory_alias_goes_to_the_model():
+    inventory = Inventory([Device("sw1"), Device("core", aliases=["spine"])])
+    assert routed("is vlan 13 on sw1 like on spine?", inventory) is None
+
+
+def test_unknown_show_command_goes_to_the_model():
+    assert routed("show me the vlans on sw1") is None
@@ -0,0 +1,18 @@
+from ai_fresh.sessions import SessionStore
+
+
+def test_session_keeps_only_its_last_turns():
+    store = SessionStore(max_turns=4)
+    session = store.get(None)
+    for i in range(10):
+        session.append("Human", f"q{i}")
+    assert [turn["content"] for turn in session.history()] == ["q6", "q7", "q8", "q9"]
+    assert store.stats()["turns"] == 4
+
+
+def test_sessions_are_found_by_id():
+    store = SessionStore()
+    session = store.get(None)
+    session.append("Human", "hello")
+    assert store.get(session.id) is session
+    assert store.get(session.id).history() == [{"type": "Human", "content": "hello"}]
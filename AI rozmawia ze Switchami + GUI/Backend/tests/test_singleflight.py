@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_waiters_retry_when_the_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        started = []
+        release = asyncio.Event()
+
+        async def call():
+            started.append(len(started))
+            await release.wait()
+            return f"result of call {len(started)}"
+
+        leader = asyncio.ensure_future(flight.do("k", call))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(flight.do("k", call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # the leader's client went away
+        leader.cancel()
+        # the waiters wake up, one of them calls again and the others join it
+        for _ in range(3):
+            await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*waiters), started, leader.cancelled()
+
+    results, started, cancelled = asyncio.run(scenario())
+    assert cancelled
+    # one waiter became the new leader, the others joined it
+    assert started == [0, 1]
+    assert results == ["result of call 2"] * 3
+
+
+def test_waiters_get_the_error_of_a_failed_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            raise ValueError("device unreachable")
+
+        tasks = [asyncio.ensure_future(flight.do("k", call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True), flight.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert stats == {"calls": 1, "saved": 2, "in_flight": 0}
+
+
+def test_cancelled_waiter_does_not_cancel_the_leader():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("k", call))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do("k", call))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        return await leader, waiter
+
+    result, waiter = asyncio.run(scenario())
+    assert result == "done"
+    with pytest.raises(asyncio.CancelledError):
+        waiter.result()
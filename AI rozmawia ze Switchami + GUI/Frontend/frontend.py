@@ -1,13 +1,16 @@
 import streamlit as st
 import requests
+import json
+import uuid
 
-def get_response(user_query, chat_history):
+def get_response(user_query, session_id):
     url = "http://localhost:8000/ask"
+    # the backend keeps the chat history of the session, only the new message is sent
     data = {
         "question": user_query,
-        "chat_history": str(chat_history)
+        "session_id": session_id
         }
-    headers = {"Content-Type": "application/json"}
+    headers = {"Content-Type": "application/json", "X-Session-Id": session_id}
     response = requests.post(url, json=data, headers=headers)
     if response.status_code == 200:
         decoded_message = response.json().get("reply")
@@ -15,11 +18,42 @@ def get_response(user_query, chat_history):
     else:
         return "Error: " + str(response.status_code)
 
+def get_response_stream(user_query, session_id, status):
+    url = "http://localhost:8000/ask/stream/"
+    data = {
+        "question": user_query,
+        "session_id": session_id
+        }
+    headers = {"Content-Type": "application/json", "X-Session-Id": session_id}
+    response = requests.post(url, json=data, headers=headers, stream=True)
+    if response.status_code != 200:
+        yield "Error: " + str(response.status_code)
+        return
+    for line in response.iter_lines():
+        if not line:
+            continue
+        frame = json.loads(line.decode("utf-8"))
+        if frame.get("type") == "delta":
+            yield frame.get("reply", "")
+        elif frame.get("type") == "deciding":
+            status.caption("Thinking...")
+        elif frame.get("type") == "querying":
+            status.caption(f"Querying {frame.get('device')}...")
+        elif frame.get("type") == "device_done":
+            status.caption(f"{frame.get('device')}: {frame.get('status')}")
+        elif frame.get("type") == "error":
+            yield "Error: " + str(frame.get("detail"))
+    status.empty()
+
 st.set_page_config(page_title="AI_Fresh Assistat")
 st.title("🧑‍💻 AI Network Engineer")
 
+streaming = st.sidebar.checkbox("Stream answers", value=True)
+
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 print(st.session_state.chat_history)
 
@@ -36,8 +70,12 @@ if user_query:
     st.session_state.chat_history.append(({"type": "Human", "content": user_query}))
     with st.chat_message("Human"):
         st.markdown(user_query)
-    response = get_response(user_query, st.session_state.chat_history)
     with st.chat_message("AI"):
+        if streaming:
+            status = st.empty()
+            response = st.write_stream(get_response_stream(user_query, st.session_state.session_id, status))
+        else:
+            response = get_response(user_query, st.session_state.session_id)
+            st.write(response)
         print(response)
-        st.write(response)
         st.session_state.chat_history.append(({"type": "AI", "content": response}))
@@ -1,10 +1,14 @@
-import requests
 import json
 import os
+import sys
 
 from dotenv import load_dotenv
 from openai import OpenAI
 
+# shared NX-API client lives next to the GUI backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "AI rozmawia ze Switchami + GUI", "Backend"))
+from nxapi import get_client
+
 
 load_dotenv()
 
@@ -60,11 +64,14 @@ def make_decision(user_input):
                                 """,
                         },
                         "show_cmd": {
-                            "type": "string",
+                            "type": "array",
+                            "items": {"type": "string"},
                             "description": """
-                                The show command to be executed on the 
-                                devices. This should be a valid Cisco NX-OS 
-                                show command.
+                                List of show commands to be executed on the 
+                                devices. Each should be a valid Cisco NX-OS 
+                                show command. If more than 1 command is 
+                                needed to answer, provide all of them at once, 
+                                they are sent to the device in one request.
                                 """,
                         },
                     },
@@ -131,59 +138,10 @@ def function_run(**arguments):
         print(f"Function {function_name} is not recognized or not implemented.")
         
 def get_info_from_devices(**kwargs):
-    switchuser = os.getenv("CISCO_USER")
-    switchpassword = os.getenv("CISCO_PASSWD")
-
     device_ips = kwargs.get("device_ips")
     show_cmd = kwargs.get("show_cmd")
 
-    if isinstance(device_ips, list) and device_ips:
-        device_ip = device_ips[0]
-    elif isinstance(device_ips, str):
-        device_ip = device_ips
-    else:
-        raise ValueError(
-            """
-            device_ips must be a list with 
-            at least one element or a string.
-            """
-        )
-
-    # print(device_ip)
-
-    url = f"https://{device_ip}/ins"
-    myheaders = {"content-type": "application/json"}
-
-    payload = {
-        "ins_api": {
-            "version": "1.0",
-            "type": "cli_show_ascii",
-            "chunk": "0",
-            "sid": "1",
-            "input": show_cmd,
-            "output_format": "json",
-        }
-    }
-
-    response = requests.post(
-        url,
-        data=json.dumps(payload),
-        headers=myheaders,
-        auth=(switchuser, switchpassword),
-        verify=False,
-    )
-
-    if response.status_code == 200:
-        # print(json.dumps(response.json(), indent=4)) #check ourput given by device
-        return response.json()
-    else:
-        print(f"Failed to execute command. Status code: {response.status_code}")
-        print(response.text)
-        return {
-            "error": "Failed to execute command",
-            "status_code": response.status_code,
-            "details": response.text,
-        }
+    return get_client().show(device_ips, show_cmd)
 
 user_input = """
 hej, czy mozesz zalogowac sie na switcha: sbx-nxos-mgmt.cisco.com 
@@ -0,0 +1,127 @@
+"""
+Local stand-in for the NX-API /ins endpoint of any number of switches.
+
+    python fake_nxapi.py --port 8443 --latency 0.05 --device-latency "sw2=0.5" --output-size 4000
+
+Point a backend at it with NXAPI_URL=http://127.0.0.1:8443/ins?device={host}.
+The device is taken from the device query parameter. cli_show_ascii returns
+--output-size characters of text per command, cli_show a VLAN table of
+similar size, cli_conf fails with --config-failure-rate probability per
+request and succeeds otherwise. Chunk mode (chunk=1)
+returns the text in --chunk-size pieces and follows the sid until "eoc".
+"""
+import uuid
+import random
+import asyncio
+import argparse
+import itertools
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+config = argparse.Namespace(
+    latency=0.05,
+    device_latency={},
+    output_size=4000,
+    chunk_size=8000,
+    config_failure_rate=0.0,
+)
+
+app = FastAPI()
+calls = {}
+_chunks = {}
+
+
+def text_output(device, command):
+    line = f"{device} {command} "
+    lines = itertools.cycle([f"{line}{i:04d}".ljust(79) + "\n" for i in range(100)])
+    body = "".join(itertools.islice(lines, config.output_size // 80 + 1))
+    return body[:config.output_size]
+
+
+def table_output(device):
+    rows = [
+        {
+            "vlanshowbr-vlanid": str(vlan),
+            "vlanshowbr-vlanname": f"VLAN{vlan:04d}",
+            "vlanshowbr-vlanstate": "active",
+            "vlanshowbr-shutstate": "noshutdown",
+        }
+        for vlan in range(1, max(2, config.output_size // 120))
+    ]
+    return {"TABLE_vlanbriefxbrief": {"ROW_vlanbriefxbrief": rows}}
+
+
+def output(code, msg, body):
+    return {"code": code, "msg": msg, "body": body}
+
+
+@app.post("/ins")
+async def ins(http_request: Request, response: Response, device: str = "switch"):
+    request = (await http_request.json())["ins_api"]
+    calls[device] = calls.get(device, 0) + 1
+    await asyncio.sleep(config.device_latency.get(device, config.latency))
+    response.set_cookie("nxapi_auth", f"{device}:{uuid.uuid4().hex}")
+
+    sid = "eoc"
+    commands = [command.strip() for command in request.get("input", "").split(";") if command.strip()]
+    if request.get("type") == "cli_conf":
+        if random.random() < config.config_failure_rate:
+            outputs = [output("400", "Input CLI command error", {})]
+        else:
+            outputs = [output("200", "Success", {}) for _ in commands]
+    elif request.get("chunk") == "1":
+        # sid "sid" starts a new chunked read, any other sid continues one
+        key = request.get("sid")
+        if key not in _chunks:
+            body = text_output(device, commands[0])
+            key = uuid.uuid4().hex
+            _chunks[key] = [body[i:i + config.chunk_size] for i in range(0, len(body), config.chunk_size)]
+        body = _chunks[key].pop(0) if _chunks[key] else ""
+        if _chunks[key]:
+            sid = key
+        else:
+            del _chunks[key]
+        outputs = [output("200", "Success", body)]
+    elif request.get("type") == "cli_show":
+        outputs = [output("200", "Success", table_output(device)) for _ in commands]
+    else:
+        outputs = [output("200", "Success", text_output(device, command)) for command in commands]
+
+    return {
+        "ins_api": {
+            "type": request.get("type"),
+            "version": "1.0",
+            "sid": sid,
+            "outputs": {"output": outputs[0] if len(outputs) == 1 else outputs},
+        }
+    }
+
+
+@app.get("/calls")
+async def get_calls():
+    """NX-API requests received per device, to compare runs."""
+    return calls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake NX-API /ins server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--latency", type=float, default=config.latency, help="seconds per request")
+    parser.add_argument("--device-latency", default="", help="per-device latency, e.g. sw1=0.1;sw2=0.8")
+    parser.add_argument("--output-size", type=int, default=config.output_size, help="characters per command")
+    parser.add_argument("--chunk-size", type=int, default=config.chunk_size)
+    parser.add_argument("--config-failure-rate", type=float, default=config.config_failure_rate,
+                        help="probability that a cli_conf request fails")
+    args = parser.parse_args()
+
+    config.latency = args.latency
+    config.device_latency = {
+        device.strip(): float(latency)
+        for device, _, latency in (item.partition("=") for item in args.device_latency.split(";") if item)
+    }
+    config.output_size = args.output_size
+    config.chunk_size = args.chunk_size
+    config.config_failure_rate = args.config_failure_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
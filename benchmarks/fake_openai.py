@@ -0,0 +1,155 @@
+"""
+Local stand-in for the OpenAI chat completions API used by the benchmarks.
+
+    python fake_openai.py --port 8001 --latency 0.3 --tokens-per-second 80
+
+Point a backend at it with OPENAI_BASE_URL=http://127.0.0.1:8001/v1.
+Requests with tools get a get_info_from_devices tool call (unless
+tool_choice is "none" or the last message is a tool result), everything
+else gets an answer of --answer-tokens tokens. stream=True is answered
+with SSE chunks in the OpenAI format, paced at --tokens-per-second, plus a
+usage chunk when stream_options.include_usage is set.
+"""
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+config = argparse.Namespace(
+    latency=0.3,
+    tokens_per_second=80.0,
+    answer_tokens=60,
+    tool_calls=True,
+    devices=["sw1"],
+    show_cmd=["show vlan brief"],
+)
+
+app = FastAPI()
+
+
+def wants_tool_call(request):
+    messages = request.get("messages", [])
+    return (
+        config.tool_calls
+        and request.get("tools")
+        and request.get("tool_choice") != "none"
+        and not (messages and messages[-1].get("role") == "tool")
+    )
+
+
+def tool_call():
+    return {
+        "id": f"call_{uuid.uuid4().hex[:24]}",
+        "type": "function",
+        "function": {
+            "name": "get_info_from_devices",
+            "arguments": json.dumps({"device_ips": config.devices, "show_cmd": config.show_cmd}),
+        },
+    }
+
+
+def answer_tokens():
+    return [f"token{i} " for i in range(config.answer_tokens)]
+
+
+def usage(request, completion_tokens):
+    prompt = sum(len(str(message.get("content") or "")) for message in request.get("messages", []))
+    prompt_tokens = prompt // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+async def stream(request, completion_id, model):
+    yield f"data: {json.dumps(chunk(completion_id, model, {'role': 'assistant', 'content': ''}))}\n\n"
+    if wants_tool_call(request):
+        call = tool_call()
+        delta = {"tool_calls": [{"index": 0, "id": call["id"], "type": "function",
+                                 "function": {"name": call["function"]["name"], "arguments": ""}}]}
+        yield f"data: {json.dumps(chunk(completion_id, model, delta))}\n\n"
+        arguments = call["function"]["arguments"]
+        # arguments arrive in a few pieces, like a real tool call stream
+        for i in range(0, len(arguments), 16):
+            await asyncio.sleep(1 / config.tokens_per_second)
+            delta = {"tool_calls": [{"index": 0, "function": {"arguments": arguments[i:i + 16]}}]}
+            yield f"data: {json.dumps(chunk(completion_id, model, delta))}\n\n"
+        yield f"data: {json.dumps(chunk(completion_id, model, {}, 'tool_calls'))}\n\n"
+    else:
+        for token in answer_tokens():
+            await asyncio.sleep(1 / config.tokens_per_second)
+            yield f"data: {json.dumps(chunk(completion_id, model, {'content': token}))}\n\n"
+        yield f"data: {json.dumps(chunk(completion_id, model, {}, 'stop'))}\n\n"
+    if (request.get("stream_options") or {}).get("include_usage"):
+        final = dict(chunk(completion_id, model, {}), choices=[], usage=usage(request, config.answer_tokens))
+        yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(http_request: Request):
+    request = await http_request.json()
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    model = request.get("model", "gpt-fake")
+    await asyncio.sleep(config.latency)
+
+    if request.get("stream"):
+        return StreamingResponse(stream(request, completion_id, model), media_type="text/event-stream")
+
+    if wants_tool_call(request):
+        message = {"role": "assistant", "content": None, "tool_calls": [tool_call()]}
+        finish_reason = "tool_calls"
+        completion_tokens = 20
+    else:
+        tokens = answer_tokens()
+        await asyncio.sleep(len(tokens) / config.tokens_per_second)
+        message = {"role": "assistant", "content": "".join(tokens)}
+        finish_reason = "stop"
+        completion_tokens = len(tokens)
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": usage(request, completion_tokens),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=config.latency, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second)
+    parser.add_argument("--answer-tokens", type=int, default=config.answer_tokens)
+    parser.add_argument("--no-tool-calls", dest="tool_calls", action="store_false",
+                        help="always answer with text")
+    parser.add_argument("--devices", default="sw1", help="devices of the tool call, ;-separated")
+    parser.add_argument("--show-cmd", default="show vlan brief", help="commands of the tool call, ;-separated")
+    args = parser.parse_args()
+
+    config.latency = args.latency
+    config.tokens_per_second = args.tokens_per_second
+    config.answer_tokens = args.answer_tokens
+    config.tool_calls = args.tool_calls
+    config.devices = args.devices.split(";")
+    config.show_cmd = args.show_cmd.split(";")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
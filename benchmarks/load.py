@@ -0,0 +1,124 @@
+"""
+Load driver for the /ask/ endpoints of both backends.
+
+    python load.py --url http://127.0.0.1:8000/ask/ --concurrency 1,4,16,64 --requests 200
+    python load.py --url http://127.0.0.1:8000/ask/stream/ --stream
+
+For every concurrency level it sends --requests questions with that many
+in flight and reports latency percentiles, time to first token and
+requests per second. Streamed responses are read line by line, the first
+line carrying answer text ({"reply": ...}, a delta frame of both
+backends) marks the first token. Without --stream the first token is the full response.
+"""
+import json
+import time
+import asyncio
+import argparse
+
+import httpx
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def is_token(line):
+    try:
+        frame = json.loads(line)
+    except ValueError:
+        return False
+    return bool(frame.get("reply"))
+
+
+async def ask(client, url, body, stream):
+    """Send one question and return (latency, time to first token)."""
+    started = time.perf_counter()
+    first_token = None
+    if stream:
+        async with client.stream("POST", url, json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if first_token is None and line and is_token(line):
+                    first_token = time.perf_counter() - started
+    else:
+        response = await client.post(url, json=body)
+        response.raise_for_status()
+    latency = time.perf_counter() - started
+    return latency, latency if first_token is None else first_token
+
+
+async def run_level(url, body, concurrency, requests, stream, timeout):
+    latencies = []
+    first_tokens = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            try:
+                latency, first_token = await ask(client, url, body, stream)
+            except (httpx.HTTPError, ValueError):
+                errors += 1
+                continue
+            latencies.append(latency)
+            first_tokens.append(first_token)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "ttft_p50": percentile(first_tokens, 50),
+        "ttft_p95": percentile(first_tokens, 95),
+    }
+
+
+def print_report(results):
+    columns = ["concurrency", "requests", "errors", "rps", "p50", "p95", "p99", "ttft_p50", "ttft_p95"]
+    print("  ".join(f"{column:>11}" for column in columns))
+    for result in results:
+        print("  ".join(
+            f"{result[column]:>11.3f}" if isinstance(result[column], float) else f"{result[column]:>11}"
+            for column in columns
+        ))
+
+
+async def main(args):
+    body = {"question": args.question, "chat_history": args.chat_history}
+    results = []
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        results.append(await run_level(args.url, body, concurrency, args.requests, args.stream, args.timeout))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency sweep against an /ask/ endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/ask/")
+    parser.add_argument("--question", default="Is vlan 10 configured on sw1?")
+    parser.add_argument("--chat-history", default="[]")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per level")
+    parser.add_argument("--stream", action="store_true", help="read the response as a stream of JSON lines")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    asyncio.run(main(parser.parse_args()))
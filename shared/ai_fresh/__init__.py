@@ -0,0 +1 @@
+"""Modules shared by both backends: stage metrics, chat sessions and stream framing."""
@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+import threading
+
+from dotenv import find_dotenv, load_dotenv
+
+# the .env of the backend being run, found from its working directory
+load_dotenv(find_dotenv(usecwd=True))
+
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", "0.05"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "256"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "10"))
+# pieces of text buffered between the completion and a slow client before reading pauses
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "64"))
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class StreamStats:
+    """
+    Counters of streamed answers. Tokens saved by a cancelled stream are
+    estimated as the average completion length so far minus what was
+    already streamed, since the real length of an unfinished answer is unknown.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.tokens_streamed = 0
+        self.tokens_saved = 0
+        self._completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.started += 1
+
+    def complete(self, tokens):
+        with self._lock:
+            self.completed += 1
+            self.tokens_streamed += tokens
+            self._completion_tokens += tokens
+
+    def fail(self, tokens):
+        with self._lock:
+            self.failed += 1
+            self.tokens_streamed += tokens
+
+    def cancel(self, tokens):
+        with self._lock:
+            self.cancelled += 1
+            self.tokens_streamed += tokens
+            average = self._completion_tokens / self.completed if self.completed else 0
+            self.tokens_saved += max(0, round(average - tokens))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "failed": self.failed,
+                "in_progress": self.started - self.completed - self.cancelled - self.failed,
+                "tokens_streamed": self.tokens_streamed,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+class FrameWriter:
+    """
+    NDJSON frames of a streamed answer, one JSON object per line:
+    {"seq": n, "type": "delta", "reply": text}, {"seq": n, "type": "heartbeat"},
+    progress frames of the switches assistant ({"seq": n, "type": "deciding"},
+    {"seq": n, "type": "querying", "device", "tool"}, {"seq": n, "type":
+    "device_done", "device", "status"}), {"seq": n, "type": "done", ...} or
+    {"seq": n, "type": "error", "detail": ...}. seq starts at 1 and has no gaps.
+    """
+
+    def __init__(self):
+        self.seq = 0
+
+    def frame(self, frame_type, **fields):
+        self.seq += 1
+        return json.dumps({"seq": self.seq, "type": frame_type, **fields}) + "\n"
+
+
+async def framed(queue, flush_seconds=STREAM_FLUSH_SECONDS, flush_chars=STREAM_FLUSH_CHARS,
+                 heartbeat_seconds=STREAM_HEARTBEAT_SECONDS):
+    """
+    Turn what the producer puts on the queue into frames. Text pieces are
+    merged and flushed after flush_seconds or once flush_chars are buffered
+    (the first piece goes out at once), dicts with a "type" are progress
+    frames sent as they are, a heartbeat is sent when nothing was sent for
+    heartbeat_seconds, so the stream stays alive while devices are queried.
+    The stream ends with the producer's final dict (without a "type") as a
+    done frame, or an exception as an error frame. ClientDisconnected ends
+    it without a frame.
+    """
+    loop = asyncio.get_running_loop()
+    writer = FrameWriter()
+    buffer = []
+    size = 0
+    first = True
+    deadline = None
+    last_sent = loop.time()
+    getter = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            timeout = (deadline if buffer else last_sent + heartbeat_seconds) - loop.time()
+            done, _ = await asyncio.wait({getter}, timeout=max(0.0, timeout))
+            if not done:
+                if buffer:
+                    yield writer.frame("delta", reply="".join(buffer))
+                    buffer, size = [], 0
+                else:
+                    yield writer.frame("heartbeat")
+                last_sent = loop.time()
+                continue
+
+            item = getter.result()
+            getter = None
+            if isinstance(item, str):
+                if not buffer:
+                    deadline = loop.time() + flush_seconds
+                buffer.append(item)
+                size += len(item)
+                if first or size >= flush_chars:
+                    yield writer.frame("delta", reply="".join(buffer))
+                    buffer, size, first = [], 0, False
+                    last_sent = loop.time()
+                continue
+
+            if buffer:
+                yield writer.frame("delta", reply="".join(buffer))
+                buffer, size = [], 0
+            if isinstance(item, ClientDisconnected):
+                return
+            if isinstance(item, dict) and "type" in item:
+                fields = dict(item)
+                yield writer.frame(fields.pop("type"), **fields)
+                last_sent = loop.time()
+                continue
+            if isinstance(item, Exception):
+                yield writer.frame("error", detail=str(item))
+            else:
+                yield writer.frame("done", **item)
+            return
+    finally:
+        if getter is not None:
+            getter.cancel()
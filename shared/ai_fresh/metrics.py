@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from dotenv import find_dotenv, load_dotenv
+
+# the .env of the backend being run, found from its working directory
+load_dotenv(find_dotenv(usecwd=True))
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name) or "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), count, total) for key, (counts, count, total) in self._series.items()}
+        for key, (counts, count, total) in sorted(series.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+            prefix = f"{labels}," if labels else ""
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram(
+    "assistant_stage_seconds",
+    "Time spent in each stage of answering a question.",
+    ("stage", "model", "device", "tool"),
+)
+
+# name -> (documentation, label name, function returning {label value: value})
+GAUGES = {}
+
+# stage durations of the request being handled, for the Server-Timing header
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+def record(stage, seconds, **labels):
+    """Add one stage duration to the histogram and to the current request's timings."""
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage, **labels):
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started, **labels)
+
+
+def start_request():
+    """Collect the timings of the current request (and the tasks it starts) in a new dict."""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def current_timings():
+    """Stage durations of the current request so far, in seconds."""
+    return {stage: round(seconds, 4) for stage, seconds in (_timings.get() or {}).items()}
+
+
+def server_timing(timings):
+    """Server-Timing header value, durations in milliseconds; stages run per device are summed."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def gauge(name, documentation, label, func):
+    """Register a gauge read at scrape time; func returns {label value: value}."""
+    GAUGES[name] = (documentation, label, func)
+
+
+def render():
+    lines = STAGE_SECONDS.render()
+    for name, (documentation, label, func) in GAUGES.items():
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{{label}="{_escape(str(key))}"}} {value}' for key, value in func().items()]
+    return "\n".join(lines) + "\n"
+
+
+async def server_timing_middleware(request, call_next):
+    """FastAPI http middleware adding the Server-Timing header to every response."""
+    if not (METRICS_ENABLED and SERVER_TIMING):
+        return await call_next(request)
+    timings = start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = server_timing(dict(timings, total=time.perf_counter() - started))
+    return response
@@ -0,0 +1,90 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+
+from dotenv import find_dotenv, load_dotenv
+
+# the .env of the backend being run, found from its working directory
+load_dotenv(find_dotenv(usecwd=True))
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+# the history sent to the model is the last turns plus a summary, older turns are never used
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "100"))
+
+
+class Session:
+    """One conversation: its last max_turns (type, content) turns, older ones are dropped."""
+
+    __slots__ = ("id", "turns", "touched")
+
+    def __init__(self, session_id, max_turns=SESSION_MAX_TURNS):
+        self.id = session_id
+        self.turns = deque(maxlen=max_turns)
+        self.touched = time.monotonic()
+
+    def append(self, turn_type, content):
+        self.turns.append((turn_type, content))
+
+    def history(self):
+        """Turns in the chat_history format of the frontends."""
+        return [{"type": turn_type, "content": content} for turn_type, content in self.turns]
+
+
+class SessionStore:
+    """
+    Server-side chat histories keyed by session id, so clients send only
+    the new message. Sessions unused for ttl seconds are evicted, and the
+    least recently used ones go first once there are max_sessions. Each
+    session keeps its last max_turns turns.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX, max_turns=SESSION_MAX_TURNS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.created = 0
+        self.evicted = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id=None):
+        """Return the session, creating it (with a new id if none is given) when it is unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = Session(session_id or uuid.uuid4().hex, self.max_turns)
+                self._sessions[session.id] = session
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            self._sessions.move_to_end(session.id)
+            session.touched = now
+            return session
+
+    def _evict(self, now):
+        # sessions are kept in order of last use, expired ones are at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.touched <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(session.turns) for session in self._sessions.values()),
+                "created": self.created,
+                "evicted": self.evicted,
+            }